@@ -0,0 +1,68 @@
+"""Busca textual em memória (filtrar_propostas com q) num banco sintético.
+
+Uso, na raiz do projeto:
+
+    python benchmarks/busca_texto.py [propostas]
+
+Mede a primeira busca, que no modo completo monta o índice de trigramas,
+e depois o melhor de várias repetições de cada consulta. O FTS5 fica
+desligado (gestor.buscador = None) para medir só a busca em memória; com
+PYTHONPATH apontando para uma cópia anterior ao índice, mede a varredura.
+"""
+import os
+import sys
+import time
+
+# a raiz do projeto vai no fim: o PYTHONPATH, se houver, tem prioridade
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados import criar_banco, isolar_banco  # noqa: E402
+
+# antes do pacote, que abre o banco de DEALFLOW_BANCO ao ser importado
+PASTA = isolar_banco()
+
+from gestor_propostas.models import GestorPropostas  # noqa: E402
+from gestor_propostas.services.storage import StorageManager  # noqa: E402
+
+CONSULTAS = [
+    # (descrição, consulta)
+    ("título", "proposta 1234"),
+    ("meio da palavra", "posta 777"),
+    ("cliente", "cliente 321 comércio"),
+    ("todas", "serviço"),
+    ("curta", "12"),
+]
+
+REPETICOES = 20
+
+
+def cronometrar(funcao) -> float:
+    inicio = time.perf_counter()
+    funcao()
+    return time.perf_counter() - inicio
+
+
+def medir(n_propostas: int):
+    StorageManager.DB_PATH = os.path.join(PASTA, "benchmark.db")
+    criar_banco(StorageManager.DB_PATH, n_propostas, itens_por_proposta=1)
+    StorageManager.init_db()
+    gestor = GestorPropostas()
+    StorageManager.carregar_tudo(gestor)
+    gestor.buscador = None
+
+    print(f"{len(gestor.propostas)} propostas")
+    primeira = cronometrar(lambda: gestor.filtrar_propostas(q="x"))
+    print(f"  primeira busca            {primeira * 1000:8.1f} ms")
+    for descricao, consulta in CONSULTAS:
+        achadas = len(gestor.filtrar_propostas(q=consulta))
+        melhor = min(
+            cronometrar(lambda: gestor.filtrar_propostas(q=consulta))
+            for _ in range(REPETICOES)
+        )
+        print(f"  {descricao:<15} {achadas:>6} achadas {melhor * 1000:8.2f} ms")
+
+    StorageManager.fechar_conexoes()
+
+
+if __name__ == "__main__":
+    medir(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,63 @@
+"""Tempo e memória de StorageManager.carregar_tudo num banco sintético.
+
+Uso, na raiz do projeto:
+
+    python benchmarks/carregamento.py [propostas] [itens_por_proposta]
+
+Mede duas cargas num banco novo e temporário (ver dados.py): uma só com o tempo e
+outra sob tracemalloc, com o pico de memória (o tracemalloc deixa a carga
+bem mais lenta). Com PYTHONPATH apontando para outra cópia do projeto,
+mede aquela versão.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+# a raiz do projeto vai no fim: o PYTHONPATH, se houver, tem prioridade
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados import criar_banco, isolar_banco  # noqa: E402
+
+PASTA = isolar_banco()
+
+from gestor_propostas.models import GestorPropostas  # noqa: E402
+from gestor_propostas.services.storage import StorageManager  # noqa: E402
+
+
+def carregar() -> GestorPropostas:
+    gestor = GestorPropostas()
+    StorageManager.carregar_tudo(gestor)
+    return gestor
+
+
+def medir(n_propostas: int, itens_por_proposta: int):
+    StorageManager.DB_PATH = os.path.join(PASTA, "benchmark.db")
+    criar_banco(StorageManager.DB_PATH, n_propostas, itens_por_proposta)
+    StorageManager.init_db()
+
+    inicio = time.perf_counter()
+    gestor = carregar()
+    duracao = time.perf_counter() - inicio
+    print(f"{len(gestor.propostas)} propostas, {n_propostas * itens_por_proposta} itens")
+    print(f"  carga                {duracao:6.2f} s")
+    del gestor
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    # mantido vivo até medir: a memória final é a do gestor carregado
+    gestor = carregar()
+    duracao = time.perf_counter() - inicio
+    atual, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(gestor.propostas) == n_propostas
+    print(f"  carga (tracemalloc)  {duracao:6.2f} s")
+    print(f"  memória final        {atual / 1e6:6.1f} MB")
+    print(f"  pico                 {pico / 1e6:6.1f} MB")
+
+    StorageManager.fechar_conexoes()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    medir(*(args + [20000, 10][len(args):]))
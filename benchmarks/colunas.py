@@ -0,0 +1,65 @@
+"""Carga e primeiro totais_por_status com e sem as colunas de itens.
+
+Uso, na raiz do projeto:
+
+    python benchmarks/colunas.py [propostas] [itens_por_proposta]
+
+Carrega o mesmo banco sintético (ver dados.py) duas vezes, sem e com
+gestor.usar_colunas() (DEALFLOW_ITENS_COLUNARES=1), e mede a carga e o
+primeiro totais_por_status, que recalcula os totais de todas as propostas.
+"""
+import gc
+import os
+import sys
+import time
+
+# a raiz do projeto vai no fim: o PYTHONPATH, se houver, tem prioridade
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados import criar_banco, isolar_banco  # noqa: E402
+
+# antes do pacote, que abre o banco de DEALFLOW_BANCO ao ser importado
+PASTA = isolar_banco()
+
+from gestor_propostas.colunas import np  # noqa: E402
+from gestor_propostas.models import GestorPropostas  # noqa: E402
+from gestor_propostas.services.storage import StorageManager  # noqa: E402
+
+
+def medir(n_propostas: int, itens_por_proposta: int):
+    StorageManager.DB_PATH = os.path.join(PASTA, "benchmark.db")
+    criar_banco(StorageManager.DB_PATH, n_propostas, itens_por_proposta)
+    StorageManager.init_db()
+
+    print(
+        f"{n_propostas} propostas, {n_propostas * itens_por_proposta} itens"
+        f" (colunas com {'NumPy' if np is not None else 'array'})"
+    )
+    valores = []
+    for colunas in (False, True):
+        # a carga anterior não pode pesar no coletor de lixo desta
+        gestor = None
+        gc.collect()
+        gestor = GestorPropostas()
+        if colunas:
+            gestor.usar_colunas()
+        inicio = time.perf_counter()
+        StorageManager.carregar_tudo(gestor)
+        carregado = time.perf_counter()
+        totais = gestor.totais_por_status()
+        fim = time.perf_counter()
+        valores.append(round(sum(valor for _, valor in totais.values()), 2))
+        nome = "com colunas" if colunas else "sem colunas"
+        print(
+            f"  {nome}  carga {carregado - inicio:5.2f} s"
+            f"  totais_por_status {fim - carregado:6.3f} s"
+        )
+    # os dois caminhos têm que chegar ao mesmo valor
+    assert valores[0] == valores[1], valores
+
+    StorageManager.fechar_conexoes()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    medir(*(args + [20000, 10][len(args):]))
@@ -0,0 +1,123 @@
+"""Bancos SQLite para os benchmarks.
+
+Chamar isolar_banco antes de importar gestor_propostas: a importação do
+pacote abre, migra e carrega o banco de DEALFLOW_BANCO, e os ids dos
+objetos criados depois são reservados nele.
+
+criar_banco cria só as tabelas iniciais (migração 1); o init_db da
+versão medida aplica as migrações que ela tiver, então o mesmo banco
+serve para comparar versões diferentes do código.
+"""
+import atexit
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+from typing import Optional
+
+_pasta: Optional[str] = None
+
+
+def isolar_banco() -> str:
+    """Aponta DEALFLOW_BANCO para um banco vazio numa pasta temporária,
+    apagada ao fim do processo, e devolve a pasta."""
+    global _pasta
+    if _pasta is None:
+        _pasta = tempfile.mkdtemp(prefix="dealflow_benchmark_")
+        atexit.register(shutil.rmtree, _pasta, True)
+        os.environ["DEALFLOW_BANCO"] = os.path.join(_pasta, "importacao.db")
+    return _pasta
+
+
+STATUS = ["rascunho", "enviada", "aceita", "recusada", "cancelada"]
+
+
+def criar_banco(
+    caminho: str,
+    propostas: int = 20000,
+    itens_por_proposta: int = 10,
+    semente: int = 1,
+):
+    """Grava em caminho (que não deve existir) um cliente para cada 10
+    propostas e itens_por_proposta itens em cada proposta."""
+    aleatorio = random.Random(semente)
+    n_clientes = max(1, propostas // 10)
+    conn = sqlite3.connect(caminho)
+    try:
+        conn.executescript(
+            """
+            CREATE TABLE clientes (
+                id INTEGER PRIMARY KEY,
+                nome TEXT NOT NULL,
+                documento TEXT,
+                contato TEXT
+            );
+            CREATE TABLE propostas (
+                id INTEGER PRIMARY KEY,
+                cliente_id INTEGER NOT NULL,
+                titulo TEXT NOT NULL,
+                data_criacao TEXT NOT NULL,
+                status TEXT NOT NULL,
+                validade TEXT,
+                responsavel TEXT,
+                condicoes_pagamento TEXT,
+                tipo_desconto TEXT,
+                desconto_percentual REAL,
+                desconto_valor REAL,
+                FOREIGN KEY (cliente_id) REFERENCES clientes(id)
+            );
+            CREATE TABLE itens (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                proposta_id INTEGER NOT NULL,
+                descricao TEXT NOT NULL,
+                quantidade INTEGER NOT NULL,
+                valor_unitario REAL NOT NULL,
+                FOREIGN KEY (proposta_id) REFERENCES propostas(id)
+            );
+            """
+        )
+        conn.executemany(
+            "INSERT INTO clientes VALUES (?, ?, ?, ?)",
+            (
+                (i, f"Cliente {i} Comércio", f"{i:014d}", f"cliente{i}@exemplo.com")
+                for i in range(1, n_clientes + 1)
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO propostas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    i,
+                    aleatorio.randint(1, n_clientes),
+                    f"Proposta {i} serviço de manutenção",
+                    f"2025-{aleatorio.randint(1, 12):02d}-{aleatorio.randint(1, 28):02d}"
+                    f" 10:{i % 60:02d}:00",
+                    aleatorio.choice(STATUS),
+                    "2026-01-01",
+                    "Responsável",
+                    "PIX",
+                    aleatorio.choice([None, "%", "R"]),
+                    5.0,
+                    10.0,
+                )
+                for i in range(1, propostas + 1)
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO itens (proposta_id, descricao, quantidade, valor_unitario)"
+            " VALUES (?, ?, ?, ?)",
+            (
+                (
+                    p,
+                    f"Item {k} da proposta {p}",
+                    aleatorio.randint(1, 9),
+                    round(aleatorio.uniform(1, 100), 2),
+                )
+                for p in range(1, propostas + 1)
+                for k in range(itens_por_proposta)
+            ),
+        )
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,74 @@
+"""Planilha em partes (gerar_excel_em_partes): primeiro byte, total e memória.
+
+Uso, na raiz do projeto:
+
+    python benchmarks/exportacao_excel.py [propostas] [itens_por_proposta]
+
+Mede, num banco sintético carregado (ver dados.py), quanto tempo leva
+até a primeira parte chegar ao consumidor, o tempo total, o tamanho da
+planilha e do arquivo temporário da aba e, numa segunda geração, o pico
+de memória (tracemalloc). O openpyxl grava toda a aba
+no arquivo temporário dele antes de compactar, então a primeira parte só
+sai depois disso.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+# a raiz do projeto vai no fim: o PYTHONPATH, se houver, tem prioridade
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados import criar_banco, isolar_banco  # noqa: E402
+
+# antes do pacote, que abre o banco de DEALFLOW_BANCO ao ser importado
+PASTA = isolar_banco()
+
+from gestor_propostas.models import GestorPropostas  # noqa: E402
+from gestor_propostas.services.excel_report import ExcelReportGenerator  # noqa: E402
+from gestor_propostas.services.storage import StorageManager  # noqa: E402
+from openpyxl.worksheet._writer import ALL_TEMP_FILES  # noqa: E402
+
+
+def gerar(gestor):
+    """Consome as partes; devolve o instante da primeira, o total de bytes
+    e o tamanho do arquivo temporário da aba nesse instante."""
+    primeira = None
+    tamanho = temporario = 0
+    for parte in ExcelReportGenerator.gerar_excel_em_partes(gestor):
+        if primeira is None:
+            primeira = time.perf_counter()
+            temporario = sum(os.path.getsize(c) for c in list(ALL_TEMP_FILES))
+        tamanho += len(parte)
+    return primeira, tamanho, temporario
+
+
+def medir(n_propostas: int, itens_por_proposta: int):
+    StorageManager.DB_PATH = os.path.join(PASTA, "benchmark.db")
+    criar_banco(StorageManager.DB_PATH, n_propostas, itens_por_proposta)
+    StorageManager.init_db()
+    gestor = GestorPropostas()
+    StorageManager.carregar_tudo(gestor)
+    # totais já calculados, como num servidor que já respondeu o painel
+    gestor.totais_por_status()
+
+    inicio = time.perf_counter()
+    primeira, tamanho, temporario = gerar(gestor)
+    total = time.perf_counter() - inicio
+    print(f"{n_propostas} propostas, planilha de {tamanho / 1e6:.1f} MB")
+    print(f"  arquivo temporário da aba  {temporario / 1e6:6.1f} MB")
+    print(f"  primeira parte             {primeira - inicio:6.2f} s")
+    print(f"  total                      {total:6.2f} s")
+
+    tracemalloc.start()
+    gerar(gestor)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  pico (tracemalloc)         {pico / 1e6:6.1f} MB")
+
+    StorageManager.fechar_conexoes()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    medir(*(args + [20000, 10][len(args):]))
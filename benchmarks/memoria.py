@@ -0,0 +1,60 @@
+"""Memória por objeto de Cliente, Proposta e ItemProposta (tracemalloc).
+
+Uso, na raiz do projeto:
+
+    python benchmarks/memoria.py [propostas] [itens_por_proposta]
+
+Para comparar com outra versão do código (ex.: antes dos __slots__),
+aponte o PYTHONPATH para uma cópia dela:
+
+    git worktree add /tmp/antes <commit>
+    PYTHONPATH=/tmp/antes python benchmarks/memoria.py
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+# a raiz do projeto vai no fim: o PYTHONPATH, se houver, tem prioridade
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados import isolar_banco  # noqa: E402
+
+# os ids dos objetos criados aqui são reservados no banco de DEALFLOW_BANCO
+isolar_banco()
+
+from gestor_propostas.models import Cliente, ItemProposta, Proposta  # noqa: E402
+
+
+def medir(n_propostas: int, itens_por_proposta: int):
+    n_clientes = max(1, n_propostas // 10)
+    gc.collect()
+    tracemalloc.start()
+
+    clientes = [Cliente(f"Cliente {i}", "doc", "contato") for i in range(n_clientes)]
+    depois_clientes = tracemalloc.get_traced_memory()[0]
+
+    propostas = [
+        Proposta(clientes[i % n_clientes], f"Proposta {i}") for i in range(n_propostas)
+    ]
+    depois_propostas = tracemalloc.get_traced_memory()[0]
+
+    for proposta in propostas:
+        for k in range(itens_por_proposta):
+            proposta.adicionar_item(ItemProposta("item", k, 1.5))
+    depois_itens = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    n_itens = n_propostas * itens_por_proposta
+    print(f"Python {sys.version.split()[0]}: {n_propostas} propostas, {n_itens} itens")
+    print(f"  Cliente      {depois_clientes / n_clientes:6.0f} B")
+    print(f"  Proposta     {(depois_propostas - depois_clientes) / n_propostas:6.0f} B")
+    if n_itens:
+        # inclui a parte da lista de itens da proposta que cabe a cada item
+        print(f"  ItemProposta {(depois_itens - depois_propostas) / n_itens:6.0f} B")
+    print(f"  total        {depois_itens / 1e6:6.1f} MB")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    medir(*(args + [10000, 20][len(args):]))
@@ -1,8 +1,12 @@
+import atexit
 import os
+
 from flask import Flask
 
 from .models import GestorPropostas
 from .services.storage import StorageManager
+from .services.cache import ExcelCache, PdfCache
+from .services.exportacoes import ExportJobs
 
 # === caminhos base ===
 # pasta do pacote gestor_propostas
@@ -13,10 +17,58 @@ ROOT_DIR = os.path.dirname(PKG_DIR)
 TEMPLATE_DIR = os.path.join(ROOT_DIR, "webapp", "templates")
 STATIC_DIR = os.path.join(ROOT_DIR, "static")
 
+# arquivo do banco SQLite (padrão: gestor_propostas.db em services/)
+CAMINHO_BANCO = os.environ.get("DEALFLOW_BANCO") or None
+
+# "completo" carrega todo o banco na memória ao iniciar;
+# "sob_demanda" lê clientes, propostas e itens conforme forem acessados
+MODO_CARREGAMENTO = os.environ.get("DEALFLOW_CARREGAMENTO", "completo")
+
+# "sincrona" grava no SQLite antes de responder; "adiada" enfileira as
+# escritas e uma thread de fundo grava em lotes a cada intervalo (segundos)
+MODO_GRAVACAO = os.environ.get("DEALFLOW_GRAVACAO", "sincrona")
+INTERVALO_GRAVACAO = float(os.environ.get("DEALFLOW_GRAVACAO_INTERVALO", "0.5"))
+
+# "1" mantém os itens também em colunas (array/NumPy) para recalcular os
+# totais de muitas propostas de uma vez; só vale no modo completo e fica
+# desligado por padrão (a cópia extra não se paga nos tamanhos comuns)
+ITENS_COLUNARES = os.environ.get("DEALFLOW_ITENS_COLUNARES", "0") == "1"
+
+# pasta dos estados das exportações em segundo plano (compartilhada entre
+# os workers) e quantas exportações rodam ao mesmo tempo em cada processo
+PASTA_EXPORTACOES = os.environ.get("DEALFLOW_EXPORTACOES_DIR") or None
+TRABALHADORES_EXPORTACAO = int(os.environ.get("DEALFLOW_EXPORTACOES_TRABALHADORES", "2"))
+
+# pasta do cache de relatórios (planilhas por versão dos dados e filtro,
+# PDFs por hash do conteúdo) e limite em disco dos PDFs, em MB
+PASTA_CACHE = os.environ.get("DEALFLOW_CACHE_DIR") or None
+LIMITE_CACHE_PDF_MB = int(os.environ.get("DEALFLOW_CACHE_PDF_MB", "256"))
+
 # instância global do gestor (usada no ui.py)
 gestor = GestorPropostas()
+if ITENS_COLUNARES:
+    gestor.usar_colunas()
+if CAMINHO_BANCO:
+    StorageManager.DB_PATH = CAMINHO_BANCO
 StorageManager.init_db()
-StorageManager.carregar_tudo(gestor)
+if MODO_CARREGAMENTO == "sob_demanda":
+    StorageManager.configurar_sob_demanda(gestor)
+else:
+    StorageManager.carregar_tudo(gestor)
+if MODO_GRAVACAO == "adiada":
+    StorageManager.configurar_gravacao_adiada(gestor, intervalo=INTERVALO_GRAVACAO)
+
+cache_excel = ExcelCache(os.path.join(PASTA_CACHE, "excel") if PASTA_CACHE else None)
+cache_pdf = PdfCache(
+    os.path.join(PASTA_CACHE, "pdf") if PASTA_CACHE else None,
+    max_disco=LIMITE_CACHE_PDF_MB * 1024 * 1024,
+)
+exportacoes = ExportJobs(
+    gestor,
+    cache_excel,
+    pasta=PASTA_EXPORTACOES,
+    trabalhadores=TRABALHADORES_EXPORTACAO,
+)
 
 
 def create_app():
@@ -36,4 +88,17 @@ def create_app():
     from .ui import bp as ui_bp
     app.register_blueprint(ui_bp)
 
+    # com vários workers cada processo tem seu próprio gestor: antes de cada
+    # requisição aplica o que os outros gravaram (custa um PRAGMA se nada mudou)
+    @app.before_request
+    def sincronizar_gestor():
+        StorageManager.sincronizar(gestor)
+
+    # grava a fila de gravação adiada e fecha as conexões SQLite
+    # reaproveitadas quando o processo encerrar
+    atexit.register(StorageManager.fechar_conexoes)
+    # registrado depois: roda antes e termina as exportações em andamento
+    # enquanto as conexões ainda estão abertas
+    atexit.register(exportacoes.parar)
+
     return app
@@ -0,0 +1,77 @@
+from array import array
+from typing import TYPE_CHECKING, Dict, List
+
+try:
+    import numpy as np
+except ImportError:  # numpy é opcional: sem ele a soma é feita em Python
+    np = None
+
+if TYPE_CHECKING:
+    from .models import ItemProposta
+
+
+class ItemColumns:
+    """Espelho colunar dos itens das propostas do gestor.
+
+    Cada item ocupa uma linha (ItemProposta._linha) em três arrays
+    contíguos: id da proposta, quantidade e valor unitário. Os objetos
+    ItemProposta continuam sendo a interface; as colunas só existem para
+    somar todos os itens de uma vez, sem percorrer objeto por objeto.
+    Linhas de itens removidos ficam com proposta -1 e são reaproveitadas.
+    """
+
+    def __init__(self):
+        self.proposta = array("q")
+        # double também para a quantidade: aceita o que o item aceitar
+        self.quantidade = array("d")
+        self.valor_unitario = array("d")
+        self._livres: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.proposta) - len(self._livres)
+
+    def anexar(self, proposta_id: int, item: "ItemProposta"):
+        if self._livres:
+            linha = self._livres.pop()
+            self.proposta[linha] = proposta_id
+            self.quantidade[linha] = item._quantidade
+            self.valor_unitario[linha] = item._valor_unitario
+        else:
+            linha = len(self.proposta)
+            self.proposta.append(proposta_id)
+            self.quantidade.append(item._quantidade)
+            self.valor_unitario.append(item._valor_unitario)
+        item._linha = linha
+
+    def atualizar(self, item: "ItemProposta"):
+        linha = item._linha
+        self.quantidade[linha] = item._quantidade
+        self.valor_unitario[linha] = item._valor_unitario
+
+    def liberar(self, item: "ItemProposta"):
+        linha = item._linha
+        self.proposta[linha] = -1
+        self.quantidade[linha] = 0.0
+        self.valor_unitario[linha] = 0.0
+        self._livres.append(linha)
+        item._linha = None
+
+    def subtotais(self) -> Dict[int, float]:
+        """Subtotal (quantidade x valor unitário) de cada proposta com itens."""
+        if np is not None:
+            # frombuffer não copia; as visões somem ao sair da função, antes
+            # de qualquer append nos arrays
+            ids = np.frombuffer(self.proposta, dtype=np.int64)
+            valores = np.frombuffer(self.quantidade) * np.frombuffer(self.valor_unitario)
+            vivos = ids >= 0
+            propostas, grupo = np.unique(ids[vivos], return_inverse=True)
+            somas = np.bincount(grupo, weights=valores[vivos], minlength=len(propostas))
+            return dict(zip(propostas.tolist(), somas.tolist()))
+
+        somas: Dict[int, float] = {}
+        for proposta_id, quantidade, valor in zip(
+            self.proposta, self.quantidade, self.valor_unitario
+        ):
+            if proposta_id >= 0:
+                somas[proposta_id] = somas.get(proposta_id, 0.0) + quantidade * valor
+        return somas
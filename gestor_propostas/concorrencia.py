@@ -0,0 +1,89 @@
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class ReadWriteLock:
+    """Vários leitores ao mesmo tempo ou um único escritor.
+
+    Escritores têm preferência: com um escritor esperando, novos leitores
+    aguardam, senão um fluxo contínuo de leituras o atrasaria para sempre.
+    A mesma thread pode reentrar (leitura dentro de leitura, qualquer coisa
+    dentro de escrita), mas não pode passar de leitura para escrita.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._leitores = 0
+        self._escritores_esperando = 0
+        self._escritor: Optional[int] = None
+        self._profundidade_escrita = 0
+        # leituras abertas pela thread atual
+        self._local = threading.local()
+
+    def adquirir_leitura(self):
+        local = self._local
+        leituras = getattr(local, "leituras", 0)
+        local.leituras = leituras + 1
+        if leituras or self._escritor == threading.get_ident():
+            # reentrada: a thread já segura o lock
+            return
+
+        with self._cond:
+            while self._escritor is not None or self._escritores_esperando:
+                self._cond.wait()
+            self._leitores += 1
+        local.contada = True
+
+    def liberar_leitura(self):
+        local = self._local
+        local.leituras -= 1
+        if local.leituras or not getattr(local, "contada", False):
+            return
+
+        local.contada = False
+        with self._cond:
+            self._leitores -= 1
+            if not self._leitores:
+                self._cond.notify_all()
+
+    def adquirir_escrita(self):
+        eu = threading.get_ident()
+        if self._escritor == eu:
+            self._profundidade_escrita += 1
+            return
+        if getattr(self._local, "leituras", 0):
+            raise RuntimeError("Não é possível pedir escrita segurando uma leitura.")
+
+        with self._cond:
+            self._escritores_esperando += 1
+            try:
+                while self._escritor is not None or self._leitores:
+                    self._cond.wait()
+            finally:
+                self._escritores_esperando -= 1
+            self._escritor = eu
+            self._profundidade_escrita = 1
+
+    def liberar_escrita(self):
+        with self._cond:
+            self._profundidade_escrita -= 1
+            if not self._profundidade_escrita:
+                self._escritor = None
+                self._cond.notify_all()
+
+    @contextmanager
+    def leitura(self) -> Iterator[None]:
+        self.adquirir_leitura()
+        try:
+            yield
+        finally:
+            self.liberar_leitura()
+
+    @contextmanager
+    def escrita(self) -> Iterator[None]:
+        self.adquirir_escrita()
+        try:
+            yield
+        finally:
+            self.liberar_escrita()
@@ -0,0 +1,96 @@
+import unicodedata
+from typing import Dict, Iterator, Set
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas e sem acentos: "Açougue São João" -> "acougue sao joao"."""
+    decomposto = unicodedata.normalize("NFKD", texto.casefold())
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+# separa os campos de um documento; é retirado das consultas, então nenhuma
+# busca casa atravessando de um campo para o outro
+SEPARADOR = "\x00"
+
+
+def _trigramas(texto: str) -> Iterator[str]:
+    for i in range(len(texto) - 2):
+        yield texto[i : i + 3]
+
+
+def _trigramas_indexados(texto: str) -> Set[str]:
+    # os que atravessam o separador nunca aparecem numa consulta
+    return {t for t in _trigramas(texto) if SEPARADOR not in t}
+
+
+class TrigramIndex:
+    """Índice de trigramas para busca por substring.
+
+    Guarda o texto normalizado de cada documento (os campos unidos por
+    SEPARADOR) e, para cada trigrama, os
+    ids dos documentos que o contêm. Uma busca com 3 ou mais caracteres
+    intersecta as listas dos trigramas da consulta (da menor para a maior)
+    e só confere a substring nos candidatos que sobraram.
+    """
+
+    def __init__(self):
+        self._textos: Dict[int, str] = {}
+        self._postings: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._textos)
+
+    def indexar(self, doc_id: int, *campos: str):
+        texto = SEPARADOR.join(normalizar(campo.replace(SEPARADOR, "")) for campo in campos)
+        if self._textos.get(doc_id) == texto:
+            return
+        self.remover(doc_id)
+        self._textos[doc_id] = texto
+        postings = self._postings
+        for trigrama in _trigramas_indexados(texto):
+            ids = postings.get(trigrama)
+            if ids is None:
+                ids = postings[trigrama] = set()
+            ids.add(doc_id)
+
+    def remover(self, doc_id: int):
+        texto = self._textos.pop(doc_id, None)
+        if texto is None:
+            return
+        postings = self._postings
+        for trigrama in _trigramas_indexados(texto):
+            ids = postings.get(trigrama)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del postings[trigrama]
+
+    def buscar(self, consulta: str) -> Set[int]:
+        """Ids dos documentos que contêm a consulta (normalizada)."""
+        consulta = normalizar(consulta.replace(SEPARADOR, ""))
+        textos = self._textos
+        if not consulta:
+            return set(textos)
+
+        trigramas = set(_trigramas(consulta))
+        if not trigramas:
+            # consulta curta demais para os trigramas: confere texto a texto
+            return {doc_id for doc_id, texto in textos.items() if consulta in texto}
+
+        listas = []
+        for trigrama in trigramas:
+            ids = self._postings.get(trigrama)
+            if not ids:
+                return set()
+            listas.append(ids)
+        listas.sort(key=len)
+
+        candidatos = set(listas[0])
+        for ids in listas[1:]:
+            candidatos &= ids
+            if not candidatos:
+                return candidatos
+        if len(consulta) == 3:
+            return candidatos
+        # os trigramas podem aparecer em outra ordem: confirma a substring
+        return {doc_id for doc_id in candidatos if consulta in textos[doc_id]}
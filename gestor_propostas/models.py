@@ -1,16 +1,54 @@
+import threading
+import weakref
+from bisect import bisect_left, insort
 from datetime import datetime
-from typing import List, Optional
+from itertools import count, islice
+from typing import Callable, ContextManager, Dict, Hashable, Iterable, List, Optional, Tuple, TypeVar
+
+from .colunas import ItemColumns
+from .concorrencia import ReadWriteLock
+from .indice_texto import TrigramIndex
 
 class Cliente:
-    _contador_id = 1
+    # __slots__ dispensa o __dict__ por instância; __weakref__ permite os
+    # caches fracos do modo sob demanda
+    __slots__ = ("id", "_nome", "documento", "contato", "_gestor", "__weakref__")
+
+    # gera o id de cada cliente novo; StorageManager.init_db troca pelo
+    # alocador do banco (services/ids.py), o contador local serve para
+    # usar os modelos sem banco
+    gerar_id: Callable[[], int] = count(1).__next__
 
     def __init__(self, nome: str, documento: str = "", contato: str = ""):
-        self.id = Cliente._contador_id
-        Cliente._contador_id += 1
+        self.id = Cliente.gerar_id()
 
-        self.nome = nome
+        self._nome = nome
         self.documento = documento
         self.contato = contato
+        # gestor avisado quando o nome muda (índice de busca)
+        self._gestor: Optional["GestorPropostas"] = None
+
+    @classmethod
+    def _hidratar(cls, id: int, nome: str, documento: str, contato: str) -> "Cliente":
+        # construtor rápido para objetos vindos do banco: não gera id novo
+        cliente = cls.__new__(cls)
+        cliente.id = id
+        cliente._nome = nome
+        cliente.documento = documento
+        cliente.contato = contato
+        cliente._gestor = None
+        return cliente
+
+    @property
+    def nome(self) -> str:
+        return self._nome
+
+    @nome.setter
+    def nome(self, valor: str):
+        antigo = self._nome
+        self._nome = valor
+        if self._gestor is not None and antigo != valor:
+            self._gestor._cliente_renomeado(self)
 
     def __str__(self) -> str:
         doc = f" | Doc: {self.documento}" if self.documento else ""
@@ -19,14 +57,75 @@ class Cliente:
 
 
 class ItemProposta:
-    def __init__(self, descricao: str, quantidade: int, valor_unitario: float):
-        self.descricao = descricao
-        self.quantidade = quantidade
-        self.valor_unitario = valor_unitario
+    __slots__ = ("id", "_descricao", "_quantidade", "_valor_unitario", "_sujo", "_proposta", "_linha")
+
+    def __init__(
+        self,
+        descricao: str,
+        quantidade: int,
+        valor_unitario: float,
+        id: Optional[int] = None,
+    ):
+        # id é atribuído pelo banco na primeira sincronização
+        self.id = id
+        self._descricao = descricao
+        self._quantidade = quantidade
+        self._valor_unitario = valor_unitario
+        # indica que um item já persistido foi alterado desde a última gravação
+        self._sujo = False
+        # proposta dona do item, avisada quando quantidade/valor mudam
+        self._proposta: Optional["Proposta"] = None
+        # linha nas colunas de itens do gestor, quando ligadas (ver ItemColumns)
+        self._linha: Optional[int] = None
+
+    @classmethod
+    def _hidratar(
+        cls, id: int, descricao: str, quantidade: int, valor_unitario: float
+    ) -> "ItemProposta":
+        item = cls.__new__(cls)
+        item.id = id
+        item._descricao = descricao
+        item._quantidade = quantidade
+        item._valor_unitario = valor_unitario
+        item._sujo = False
+        item._proposta = None
+        item._linha = None
+        return item
+
+    @property
+    def descricao(self) -> str:
+        return self._descricao
+
+    @descricao.setter
+    def descricao(self, valor: str):
+        self._descricao = valor
+        self._sujo = True
+
+    @property
+    def quantidade(self) -> int:
+        return self._quantidade
+
+    @quantidade.setter
+    def quantidade(self, valor: int):
+        self._quantidade = valor
+        self._sujo = True
+        if self._proposta is not None:
+            self._proposta._item_alterado(self)
+
+    @property
+    def valor_unitario(self) -> float:
+        return self._valor_unitario
+
+    @valor_unitario.setter
+    def valor_unitario(self, valor: float):
+        self._valor_unitario = valor
+        self._sujo = True
+        if self._proposta is not None:
+            self._proposta._item_alterado(self)
 
     @property
     def total(self) -> float:
-        return self.quantidade * self.valor_unitario
+        return self._quantidade * self._valor_unitario
 
     def __str__(self) -> str:
         return (
@@ -36,7 +135,30 @@ class ItemProposta:
 
 
 class Proposta:
-    _contador_id = 1
+    __slots__ = (
+        "id",
+        "_cliente",
+        "_titulo",
+        "data_criacao",
+        "_status",
+        "validade",
+        "responsavel",
+        "condicoes_pagamento",
+        "_tipo_desconto",
+        "_desconto_percentual",
+        "_desconto_valor",
+        "_itens",
+        "_carregador_itens",
+        "_subtotal_salvo",
+        "_itens_removidos",
+        "_totais",
+        "_gestor",
+        "_total_registrado",
+        "__weakref__",
+    )
+
+    # mesmo esquema de Cliente.gerar_id
+    gerar_id: Callable[[], int] = count(1).__next__
     STATUS_VALIDOS = ["rascunho", "enviada", "aceita", "recusada", "cancelada"]
 
     def __init__(
@@ -47,27 +169,206 @@ class Proposta:
         responsavel: str = "",
         condicoes_pagamento: str = "",
     ):
-        self.id = Proposta._contador_id
-        Proposta._contador_id += 1
-
-        self.cliente = cliente
-        self.titulo = titulo or f"Proposta {self.id}"
-        self.data_criacao = datetime.now()
-        self.status = "rascunho"
-        self.itens: List[ItemProposta] = []
+        self.id = Proposta.gerar_id()
+
+        self._cliente = cliente
+        self._titulo = titulo or f"Proposta {self.id}"
+        # sem microssegundos, igual ao que fica gravado no banco: a chave
+        # (data_criacao, id) da paginação é a mesma antes e depois de recarregar
+        self.data_criacao = datetime.now().replace(microsecond=0)
+        self._status = "rascunho"
+        self._itens: Optional[List[ItemProposta]] = []
+        # no modo sob demanda os itens só são lidos do banco no primeiro acesso
+        self._carregador_itens: Optional[Callable[["Proposta"], List[ItemProposta]]] = None
+        # subtotal gravado no banco; usado enquanto os itens não são carregados
+        self._subtotal_salvo: Optional[float] = None
+        # ids de itens já persistidos que foram removidos da proposta
+        # (criada só quando há remoção, para economizar memória)
+        self._itens_removidos: Optional[List[int]] = None
+        # (subtotal, desconto, total) já calculados; None quando desatualizado
+        self._totais: Optional[Tuple[float, float, float]] = None
+        # gestor que mantém as métricas agregadas e o total já contabilizado nelas
+        self._gestor: Optional["GestorPropostas"] = None
+        self._total_registrado = 0.0
         self.validade = validade         
         self.responsavel = responsavel
         self.condicoes_pagamento = condicoes_pagamento
 
-        self.tipo_desconto = None  
-        self.desconto_percentual = 0.0
-        self.desconto_valor = 0.0
+        self._tipo_desconto: Optional[str] = None
+        self._desconto_percentual = 0.0
+        self._desconto_valor = 0.0
+
+    @classmethod
+    def _hidratar(
+        cls,
+        id: int,
+        cliente: Cliente,
+        titulo: str,
+        data_criacao: datetime,
+        status: str,
+        validade,
+        responsavel: str,
+        condicoes_pagamento: str,
+        tipo_desconto: Optional[str],
+        desconto_percentual: float,
+        desconto_valor: float,
+        subtotal_salvo: Optional[float] = None,
+    ) -> "Proposta":
+        # construtor rápido para objetos vindos do banco: sem gerar id,
+        # sem datetime.now() e sem validações que o banco já garante
+        proposta = cls.__new__(cls)
+        proposta.id = id
+        proposta._cliente = cliente
+        proposta._titulo = titulo
+        proposta.data_criacao = data_criacao
+        proposta._status = status
+        proposta._itens = []
+        proposta._carregador_itens = None
+        proposta._subtotal_salvo = subtotal_salvo
+        proposta._itens_removidos = None
+        proposta._totais = None
+        proposta._gestor = None
+        proposta._total_registrado = 0.0
+        proposta.validade = validade
+        proposta.responsavel = responsavel
+        proposta.condicoes_pagamento = condicoes_pagamento
+        proposta._tipo_desconto = tipo_desconto
+        proposta._desconto_percentual = desconto_percentual
+        proposta._desconto_valor = desconto_valor
+        return proposta
+
+    # Título e cliente entram no índice de busca do gestor: as propriedades
+    # avisam quando mudam.
+
+    @property
+    def titulo(self) -> str:
+        return self._titulo
+
+    @titulo.setter
+    def titulo(self, valor: str):
+        self._titulo = valor
+        if self._gestor is not None:
+            self._gestor._texto_alterado(self)
+
+    @property
+    def cliente(self) -> Cliente:
+        return self._cliente
+
+    @cliente.setter
+    def cliente(self, valor: Cliente):
+        self._cliente = valor
+        if self._gestor is not None:
+            self._gestor._texto_alterado(self)
+
+    # ---- Itens ---- #
+    # Altere a lista por adicionar_item/remover_item, ou troque-a inteira
+    # atribuindo a itens: eles mantêm os totais em cache e o controle de
+    # remoções usado na sincronização com o banco.
+
+    @property
+    def itens(self) -> List[ItemProposta]:
+        if self._itens is None:
+            carregador = self._carregador_itens
+            itens = carregador(self) if carregador else []
+            for item in itens:
+                item._proposta = self
+            self._itens = itens
+            self._itens_entraram(itens)
+            self._invalidar_totais()
+        return self._itens
+
+    @itens.setter
+    def itens(self, itens: Optional[List[ItemProposta]]):
+        # None só descarrega a lista (o carregador a lê de novo no próximo
+        # acesso); uma lista nova substitui os itens, e os já persistidos
+        # que ficaram de fora são registrados como removidos
+        antigos = (self._itens or []) if itens is None else self.itens
+        if antigos:
+            self._itens_sairam(antigos)
+        if itens is not None:
+            mantidos = {id(item) for item in itens}
+            for item in antigos:
+                if id(item) not in mantidos:
+                    self._item_removido(item)
+            for item in itens:
+                item._proposta = self
+            self._itens_entraram(itens)
+        self._itens = itens
+        self._invalidar_totais()
+
+    def itens_carregados(self) -> bool:
+        return self._itens is not None
 
     def adicionar_item(self, item: ItemProposta):
         self.itens.append(item)
+        item._proposta = self
+        self._itens_entraram((item,))
+        self._invalidar_totais()
 
-    def calcular_subtotal(self) -> float:
-        return sum(item.total for item in self.itens)
+    def remover_item(self, item: ItemProposta):
+        self.itens.remove(item)
+        self._itens_sairam((item,))
+        self._item_removido(item)
+        self._invalidar_totais()
+
+    def _item_removido(self, item: ItemProposta):
+        item._proposta = None
+        if item.id is not None:
+            if self._itens_removidos is None:
+                self._itens_removidos = []
+            self._itens_removidos.append(item.id)
+
+    # Com as colunas de itens ligadas no gestor, cada item da proposta ocupa
+    # uma linha nelas; estes ganchos mantêm as linhas em dia.
+
+    def _itens_entraram(self, itens: Iterable[ItemProposta]):
+        colunas = self._gestor._colunas if self._gestor is not None else None
+        if colunas is not None:
+            for item in itens:
+                colunas.anexar(self.id, item)
+
+    def _itens_sairam(self, itens: Iterable[ItemProposta]):
+        colunas = self._gestor._colunas if self._gestor is not None else None
+        if colunas is not None:
+            for item in itens:
+                if item._linha is not None:
+                    colunas.liberar(item)
+
+    def _item_alterado(self, item: ItemProposta):
+        if item._linha is not None:
+            self._gestor._colunas.atualizar(item)
+        self._invalidar_totais()
+
+    # ---- Desconto ---- #
+    # Propriedades para que atribuições diretas (como faz a rota de desconto)
+    # também invalidem os totais em cache.
+
+    @property
+    def tipo_desconto(self) -> Optional[str]:
+        return self._tipo_desconto
+
+    @tipo_desconto.setter
+    def tipo_desconto(self, valor: Optional[str]):
+        self._tipo_desconto = valor
+        self._invalidar_totais()
+
+    @property
+    def desconto_percentual(self) -> float:
+        return self._desconto_percentual
+
+    @desconto_percentual.setter
+    def desconto_percentual(self, valor: float):
+        self._desconto_percentual = valor
+        self._invalidar_totais()
+
+    @property
+    def desconto_valor(self) -> float:
+        return self._desconto_valor
+
+    @desconto_valor.setter
+    def desconto_valor(self, valor: float):
+        self._desconto_valor = valor
+        self._invalidar_totais()
 
     def definir_desconto_percentual(self, percentual: float):
         self.tipo_desconto = "%"
@@ -79,18 +380,58 @@ class Proposta:
         self.desconto_valor = max(0.0, valor)
         self.desconto_percentual = 0.0
 
+    # ---- Totais ---- #
+
+    def _invalidar_totais(self):
+        self._totais = None
+        if self._gestor is not None:
+            self._gestor._total_alterado(self)
+
+    def _calcular_totais(self) -> Tuple[float, float, float]:
+        totais = self._totais
+        if totais is not None:
+            return totais
+
+        if self._itens is None and self._subtotal_salvo is not None:
+            # modo sob demanda: evita ler os itens só para somar
+            subtotal = self._subtotal_salvo
+        else:
+            subtotal = sum(item.total for item in self.itens)
+        return self._fixar_totais(subtotal)
+
+    def _fixar_totais(self, subtotal: float) -> Tuple[float, float, float]:
+        # aplica o desconto sobre o subtotal e guarda o resultado no cache
+        if self._tipo_desconto == "%":
+            desconto = subtotal * (self._desconto_percentual / 100.0)
+        elif self._tipo_desconto == "R":
+            desconto = self._desconto_valor
+        else:
+            desconto = 0.0
+
+        totais = self._totais = (subtotal, desconto, max(0.0, subtotal - desconto))
+        return totais
+
+    def calcular_subtotal(self) -> float:
+        return self._calcular_totais()[0]
+
     def calcular_desconto(self) -> float:
-        subtotal = self.calcular_subtotal()
-        if self.tipo_desconto == "%":
-            return subtotal * (self.desconto_percentual / 100.0)
-        elif self.tipo_desconto == "R":
-            return self.desconto_valor
-        return 0.0
+        return self._calcular_totais()[1]
 
     def calcular_total(self) -> float:
-        subtotal = self.calcular_subtotal()
-        desconto = self.calcular_desconto()
-        return max(0.0, subtotal - desconto)
+        return self._calcular_totais()[2]
+
+    # ---- Status ---- #
+
+    @property
+    def status(self) -> str:
+        return self._status
+
+    @status.setter
+    def status(self, novo_status: str):
+        antigo = self._status
+        self._status = novo_status
+        if self._gestor is not None and antigo != novo_status:
+            self._gestor._status_alterado(self, antigo)
 
     def alterar_status(self, novo_status: str):
         novo_status = novo_status.lower()
@@ -108,26 +449,183 @@ class Proposta:
         )
 
 
+K = TypeVar("K", bound=Hashable)
+
+
+def _campos_busca(proposta: Proposta) -> Tuple[str, str]:
+    return proposta.titulo, proposta.cliente.nome
+
+
+def _remover_chave(chaves: List[Tuple[datetime, int]], proposta: Proposta):
+    chave = (proposta.data_criacao, proposta.id)
+    i = bisect_left(chaves, chave)
+    if i < len(chaves) and chaves[i] == chave:
+        del chaves[i]
+    else:
+        chaves[:] = [c for c in chaves if c[1] != proposta.id]
+
+
 class GestorPropostas:
     def __init__(self):
-        self.clientes: List[Cliente] = []
-        self.propostas: List[Proposta] = []
+        # índices por id: são a fonte de verdade no modo completo e preservam
+        # a ordem de inserção (a ordem de carga, por id)
+        self._clientes_por_id: Dict[int, Cliente] = {}
+        self._propostas_por_id: Dict[int, Proposta] = {}
+
+        # propostas de cada status, como chaves (data_criacao, id) ordenadas;
+        # status sem nenhuma proposta não aparecem aqui
+        self._por_status: Dict[str, List[Tuple[datetime, int]]] = {}
+        # as mesmas chaves de todas as propostas, para a paginação sem status
+        self._ordem: List[Tuple[datetime, int]] = []
+
+        # métricas do painel mantidas incrementalmente (modo completo): cada
+        # proposta avisa o gestor quando muda de status ou de total; totais
+        # alterados ficam pendentes e são recalculados na próxima leitura
+        self._valor_por_status: Dict[str, float] = {}
+        self._totais_pendentes: Dict[int, Proposta] = {}
+
+        # colunas opcionais com os itens de todas as propostas (modo
+        # completo), para recalcular muitos subtotais de uma vez (ver usar_colunas)
+        self._colunas: Optional[ItemColumns] = None
+
+        # Modo sob demanda: quando há um repositório (ver
+        # StorageManager.configurar_sob_demanda), os índices acima ficam vazios
+        # e os objetos são lidos do banco conforme a necessidade. Os caches
+        # garantem que o mesmo id devolva o mesmo objeto enquanto estiver em uso.
+        self.repositorio = None
+        self._cache_clientes: "weakref.WeakValueDictionary[int, Cliente]" = weakref.WeakValueDictionary()
+        self._cache_propostas: "weakref.WeakValueDictionary[int, Proposta]" = weakref.WeakValueDictionary()
+
+        # busca textual do banco (FTS5), quando disponível: recebe o texto e
+        # devolve os ids das propostas encontradas, por relevância
+        self.buscador: Optional[Callable[[str], Optional[List[int]]]] = None
+        # índice de trigramas de título + cliente (modo completo), montado na
+        # primeira busca e mantido a cada criação, renomeação e exclusão
+        self._indice_texto: Optional[TrigramIndex] = None
+        self._lock_indice = threading.Lock()
+
+        # até onde o gestor está em dia com o log de alterações do banco
+        # (ver StorageManager.sincronizar)
+        self.ultima_alteracao = 0
+
+        # O gestor é compartilhado entre as threads do servidor: quem só lê
+        # usa leitura(), quem altera o gestor ou suas propostas usa escrita().
+        self._lock = ReadWriteLock()
+        # leitores concorrentes podem disparar o recálculo dos totais pendentes
+        self._lock_totais = threading.Lock()
+
+    def leitura(self) -> ContextManager[None]:
+        return self._lock.leitura()
+
+    def escrita(self) -> ContextManager[None]:
+        return self._lock.escrita()
+
+    # a partir de quantos totais pendentes vale somar pelas colunas
+    LIMIAR_COLUNAS = 256
+
+    def usar_colunas(self):
+        """Liga as colunas de itens (só têm efeito no modo completo).
+
+        São uma cópia a mais de cada item, mantida a cada alteração: a carga
+        fica mais lenta e só o primeiro recálculo de muitos totais fica mais
+        rápido. Não compensa nos tamanhos comuns (ver benchmarks/colunas.py).
+        """
+        if self._colunas is not None:
+            return
+        self._colunas = ItemColumns()
+        for proposta in self._propostas_por_id.values():
+            proposta._itens_entraram(proposta._itens or ())
+
+    @property
+    def sob_demanda(self) -> bool:
+        return self.repositorio is not None
+
+    @property
+    def clientes(self) -> List[Cliente]:
+        return list(self._clientes_por_id.values())
+
+    @property
+    def propostas(self) -> List[Proposta]:
+        return list(self._propostas_por_id.values())
+
+    def limpar(self):
+        for proposta in self._propostas_por_id.values():
+            proposta._itens_sairam(proposta._itens or ())
+            proposta._gestor = None
+        for cliente in self._clientes_por_id.values():
+            cliente._gestor = None
+        self._indice_texto = None
+        self._clientes_por_id.clear()
+        self._propostas_por_id.clear()
+        self._por_status.clear()
+        self._ordem.clear()
+        self._valor_por_status.clear()
+        self._totais_pendentes.clear()
+        self._cache_clientes.clear()
+        self._cache_propostas.clear()
+
+    # ---- Clientes ---- #
+
+    def adicionar_cliente(self, cliente: Cliente):
+        if self.sob_demanda:
+            self._cache_clientes[cliente.id] = cliente
+        else:
+            self._clientes_por_id[cliente.id] = cliente
+            cliente._gestor = self
 
     def criar_cliente(self, nome: str, documento: str = "", contato: str = "") -> Cliente:
         cliente = Cliente(nome, documento, contato)
-        self.clientes.append(cliente)
+        self.adicionar_cliente(cliente)
         return cliente
 
     def listar_clientes(self) -> List[Cliente]:
+        if self.sob_demanda:
+            return self.repositorio.buscar_clientes(self)
         return self.clientes
 
+    def obter_cliente(self, cliente_id: int) -> Optional[Cliente]:
+        if self.sob_demanda:
+            cliente = self._cache_clientes.get(cliente_id)
+            if cliente is None:
+                cliente = self.repositorio.buscar_cliente(self, cliente_id)
+            return cliente
+        return self._clientes_por_id.get(cliente_id)
+
+    def remover_cliente(self, cliente_id: int) -> Optional[Cliente]:
+        if self.sob_demanda:
+            return self._cache_clientes.pop(cliente_id, None)
+        cliente = self._clientes_por_id.pop(cliente_id, None)
+        if cliente is not None:
+            cliente._gestor = None
+        return cliente
+
     def obter_cliente_por_indice(self, indice: int) -> Optional[Cliente]:
-        if 0 <= indice < len(self.clientes):
-            return self.clientes[indice]
+        if 0 <= indice < len(self._clientes_por_id):
+            return next(islice(self._clientes_por_id.values(), indice, None))
         return None
 
+    def contar_clientes(self) -> int:
+        if self.sob_demanda:
+            return self.repositorio.contar_clientes()
+        return len(self._clientes_por_id)
+
     # ---- Propostas ---- #
 
+    def adicionar_proposta(self, proposta: Proposta):
+        if self.sob_demanda:
+            self._cache_propostas[proposta.id] = proposta
+            return
+
+        self._propostas_por_id[proposta.id] = proposta
+        proposta._gestor = self
+        proposta._total_registrado = 0.0
+        proposta._itens_entraram(proposta._itens or ())
+        if self._indice_texto is not None:
+            self._indice_texto.indexar(proposta.id, *_campos_busca(proposta))
+        insort(self._ordem, (proposta.data_criacao, proposta.id))
+        self._entrar_no_status(proposta, proposta.status)
+        self._totais_pendentes[proposta.id] = proposta
+
     def criar_proposta(
         self,
         cliente: Cliente,
@@ -143,13 +641,247 @@ class GestorPropostas:
             responsavel=responsavel,
             condicoes_pagamento=condicoes_pagamento,
         )
-        self.propostas.append(proposta)
+        self.adicionar_proposta(proposta)
         return proposta
 
     def listar_propostas(self) -> List[Proposta]:
+        if self.sob_demanda:
+            return self.repositorio.buscar_propostas(self)
         return self.propostas
 
+    def obter_proposta(self, proposta_id: int) -> Optional[Proposta]:
+        if self.sob_demanda:
+            proposta = self._cache_propostas.get(proposta_id)
+            if proposta is None:
+                proposta = self.repositorio.buscar_proposta(self, proposta_id)
+            return proposta
+        return self._propostas_por_id.get(proposta_id)
+
+    def remover_proposta(self, proposta_id: int) -> Optional[Proposta]:
+        if self.sob_demanda:
+            return self._cache_propostas.pop(proposta_id, None)
+
+        proposta = self._propostas_por_id.pop(proposta_id, None)
+        if proposta is not None:
+            self._totais_pendentes.pop(proposta_id, None)
+            _remover_chave(self._ordem, proposta)
+            self._sair_do_status(proposta, proposta.status)
+            proposta._itens_sairam(proposta._itens or ())
+            if self._indice_texto is not None:
+                self._indice_texto.remover(proposta_id)
+            proposta._gestor = None
+        return proposta
+
     def obter_proposta_por_indice(self, indice: int) -> Optional[Proposta]:
-        if 0 <= indice < len(self.propostas):
-            return self.propostas[indice]
+        if 0 <= indice < len(self._propostas_por_id):
+            return next(islice(self._propostas_por_id.values(), indice, None))
         return None
+
+    def filtrar_propostas(
+        self,
+        status: str = "",
+        q: str = "",
+        limite: Optional[int] = None,
+    ) -> List[Proposta]:
+        q = q.strip().lower()
+        if self.sob_demanda:
+            return self.repositorio.buscar_propostas(
+                self, status=status, q=q, limite=limite
+            )
+
+        por_id = self._propostas_por_id
+        propostas: Iterable[Proposta]
+        if q:
+            propostas = (por_id[i] for i in self._buscar_ids(q) if i in por_id)
+            if status:
+                propostas = (p for p in propostas if p.status == status)
+        elif status:
+            # só percorre o bucket do status pedido
+            propostas = (por_id[pid] for _, pid in self._por_status.get(status, ()))
+        else:
+            propostas = por_id.values()
+        return list(islice(propostas, limite))
+
+    def paginar_propostas(
+        self,
+        status: str = "",
+        q: str = "",
+        limite: int = 20,
+        cursor: Optional[Tuple[datetime, int]] = None,
+    ) -> Tuple[List[Proposta], Optional[Tuple[datetime, int]]]:
+        """Uma página de propostas, da mais recente para a mais antiga.
+
+        cursor é a chave (data_criacao, id) da última proposta da página
+        anterior; devolve a página e o cursor da próxima (None no fim).
+        """
+        q = q.strip().lower()
+        if self.sob_demanda:
+            return self.repositorio.paginar_propostas(
+                self, status=status, q=q, limite=limite, cursor=cursor
+            )
+
+        por_id = self._propostas_por_id
+        chaves: List[Tuple[datetime, int]]
+        if q:
+            # só as propostas encontradas, reordenadas pela chave
+            encontradas = (por_id[i] for i in self._buscar_ids(q) if i in por_id)
+            if status:
+                encontradas = (p for p in encontradas if p.status == status)
+            chaves = sorted((p.data_criacao, p.id) for p in encontradas)
+        elif status:
+            chaves = self._por_status.get(status, [])
+        else:
+            chaves = self._ordem
+
+        fim = bisect_left(chaves, cursor) if cursor is not None else len(chaves)
+        propostas = (por_id[chaves[i][1]] for i in range(fim - 1, -1, -1))
+
+        # um a mais só para saber se existe próxima página
+        pagina = list(islice(propostas, limite + 1))
+        if len(pagina) > limite:
+            ultima = pagina[limite - 1]
+            return pagina[:limite], (ultima.data_criacao, ultima.id)
+        return pagina, None
+
+    # ---- Busca textual ---- #
+
+    def _indice(self) -> TrigramIndex:
+        indice = self._indice_texto
+        if indice is None:
+            # leitores concorrentes podem chegar aqui juntos: monta uma vez só
+            with self._lock_indice:
+                indice = self._indice_texto
+                if indice is None:
+                    indice = TrigramIndex()
+                    for proposta in self._propostas_por_id.values():
+                        indice.indexar(proposta.id, *_campos_busca(proposta))
+                    self._indice_texto = indice
+        return indice
+
+    def _buscar_ids(self, q: str) -> List[int]:
+        """Ids que casam com q: os do buscador (FTS), por relevância, seguidos
+        dos que só o índice de trigramas acha (substring no meio da palavra)."""
+        achados = self._indice().buscar(q)
+        ids = self.buscador(q) if self.buscador is not None else None
+        if not ids:
+            return sorted(achados)
+        return ids + sorted(achados.difference(ids))
+
+    def _texto_alterado(self, proposta: Proposta):
+        if self._indice_texto is not None:
+            self._indice_texto.indexar(proposta.id, *_campos_busca(proposta))
+
+    def _cliente_renomeado(self, cliente: Cliente):
+        # renomear cliente é raro: percorrer as propostas é suficiente
+        if self._indice_texto is not None:
+            for proposta in self._propostas_por_id.values():
+                if proposta.cliente is cliente:
+                    self._indice_texto.indexar(proposta.id, *_campos_busca(proposta))
+
+    # ---- Métricas ---- #
+
+    # A data de criação não muda depois que a proposta é criada, então a
+    # chave (data_criacao, id) é estável e serve para ordenar os buckets.
+
+    def _entrar_no_status(self, proposta: Proposta, status: str):
+        insort(self._por_status.setdefault(status, []), (proposta.data_criacao, proposta.id))
+        self._valor_por_status[status] = (
+            self._valor_por_status.get(status, 0.0) + proposta._total_registrado
+        )
+
+    def _sair_do_status(self, proposta: Proposta, status: str):
+        chaves = self._por_status[status]
+        _remover_chave(chaves, proposta)
+
+        if chaves:
+            self._valor_por_status[status] -= proposta._total_registrado
+        else:
+            # zera de fato, sem acumular erro de ponto flutuante
+            del self._por_status[status]
+            del self._valor_por_status[status]
+
+    def _status_alterado(self, proposta: Proposta, antigo: str):
+        self._sair_do_status(proposta, antigo)
+        self._entrar_no_status(proposta, proposta.status)
+
+    def _total_alterado(self, proposta: Proposta):
+        self._totais_pendentes[proposta.id] = proposta
+
+    def _aplicar_totais_pendentes(self):
+        pendentes = self._totais_pendentes
+        if not pendentes:
+            return
+        with self._lock_totais:
+            if self._colunas is not None and len(pendentes) >= self.LIMIAR_COLUNAS:
+                # muitos totais a refazer (ex.: logo após carregar_tudo):
+                # um group-by nas colunas no lugar de somar proposta a proposta
+                subtotais = self._colunas.subtotais()
+                for proposta in pendentes.values():
+                    if proposta._totais is None:
+                        proposta._fixar_totais(subtotais.get(proposta.id, 0.0))
+
+            valores = self._valor_por_status
+            for proposta in pendentes.values():
+                total = proposta.calcular_total()
+                valores[proposta.status] += total - proposta._total_registrado
+                proposta._total_registrado = total
+            pendentes.clear()
+
+    def listar_status(self) -> List[str]:
+        if self.sob_demanda:
+            return self.repositorio.listar_status()
+        return sorted(self._por_status)
+
+    def contar_propostas(self, status: str = "") -> int:
+        if self.sob_demanda:
+            return self.repositorio.contar_propostas(status)
+        if status:
+            return len(self._por_status.get(status, ()))
+        return len(self._propostas_por_id)
+
+    def totais_por_status(self) -> Dict[str, Tuple[int, float]]:
+        """Quantidade e valor total das propostas, agrupados por status."""
+        if self.sob_demanda:
+            return self.repositorio.totais_por_status()
+        self._aplicar_totais_pendentes()
+        return {
+            status: (len(self._por_status[status]), self._valor_por_status[status])
+            for status in sorted(self._por_status)
+        }
+
+    def subtotais_por_proposta(self) -> Dict[int, float]:
+        if self._colunas is not None:
+            subtotais = self._colunas.subtotais()
+            return {pid: subtotais.get(pid, 0.0) for pid in self._propostas_por_id}
+        return {pid: p.calcular_subtotal() for pid, p in self._propostas_por_id.items()}
+
+    def receita_por(self, chave: Callable[[Proposta], K], status: str = "") -> Dict[K, float]:
+        """Soma dos totais (com desconto) agrupada por chave(proposta).
+
+        Ex.: ``receita_por(lambda p: p.cliente.id)`` ou
+        ``receita_por(lambda p: p.data_criacao.strftime("%Y-%m"), "aceita")``.
+        """
+        if self.sob_demanda:
+            propostas: Iterable[Proposta] = self.repositorio.buscar_propostas(self, status=status)
+        else:
+            # os totais ficam em cache; os que faltam são recalculados juntos
+            self._aplicar_totais_pendentes()
+            if status:
+                por_id = self._propostas_por_id
+                propostas = (por_id[pid] for _, pid in self._por_status.get(status, ()))
+            else:
+                propostas = self._propostas_por_id.values()
+
+        somas: Dict[K, float] = {}
+        for proposta in propostas:
+            k = chave(proposta)
+            somas[k] = somas.get(k, 0.0) + proposta.calcular_total()
+        return somas
+
+    def valor_total(self, status: str = "") -> float:
+        if self.sob_demanda:
+            return self.repositorio.somar_totais(status)
+        self._aplicar_totais_pendentes()
+        if status:
+            return self._valor_por_status.get(status, 0.0)
+        return sum(self._valor_por_status.values())
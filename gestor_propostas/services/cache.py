@@ -0,0 +1,293 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, Optional
+
+
+def _remover(caminho: str):
+    try:
+        os.remove(caminho)
+    except OSError:
+        # já removido (por outro worker, ou nunca criado)
+        pass
+
+
+class ExcelCache:
+    """Planilhas já geradas, em disco, por versão dos dados e filtro.
+
+    A chave junta a identidade do banco (StorageManager.IDENTIDADE_BANCO),
+    a versão (StorageManager.versao_dados) e o filtro: enquanto nada for gravado, repetir a exportação devolve o
+    mesmo arquivo, e a chave serve de ETag. Qualquer alteração muda a
+    versão, então não há o que invalidar; as planilhas antigas só deixam
+    de ser pedidas e saem quando a pasta passa de ``max_arquivos``
+    (as usadas há mais tempo primeiro).
+    """
+
+    def __init__(self, pasta: Optional[str] = None, max_arquivos: int = 32):
+        self.pasta = pasta or os.path.join(tempfile.gettempdir(), "dealflow_cache", "excel")
+        self.max_arquivos = max_arquivos
+        os.makedirs(self.pasta, exist_ok=True)
+
+    @staticmethod
+    def chave(banco: str, versao: int, **filtro) -> str:
+        dados = json.dumps([banco, versao, filtro], sort_keys=True, default=str)
+        return hashlib.sha1(dados.encode("utf-8")).hexdigest()
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.pasta, f"{chave}.xlsx")
+
+    def obter(self, chave: str) -> Optional[str]:
+        """Caminho da planilha da chave, ou None se não estiver no cache."""
+        caminho = self._caminho(chave)
+        try:
+            # marca como usada agora (a poda remove as usadas há mais tempo)
+            os.utime(caminho)
+        except OSError:
+            return None
+        return caminho
+
+    def abrir(self, chave: str) -> Optional[BinaryIO]:
+        """Planilha da chave aberta para leitura, ou None se não estiver no cache.
+
+        Para enviar o arquivo, use esta e não obter: a poda de outro worker
+        pode apagá-lo entre obter e a abertura, mas um arquivo já aberto
+        continua legível.
+        """
+        caminho = self._caminho(chave)
+        try:
+            arquivo = open(caminho, "rb")
+        except OSError:
+            return None
+        try:
+            os.utime(caminho)
+        except OSError:
+            # apagado logo depois de aberto: a leitura continua valendo
+            pass
+        return arquivo
+
+    def guardar(self, chave: str, gerar: Callable[[str], None]) -> str:
+        """Gera a planilha com gerar(caminho) e a coloca no cache."""
+        caminho = self._caminho(chave)
+        temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+        try:
+            gerar(temporario)
+            os.replace(temporario, caminho)
+        finally:
+            _remover(temporario)
+        self._podar()
+        return caminho
+
+    def guardar_em_partes(self, chave: str, partes: Iterable[bytes]) -> Iterator[bytes]:
+        """Repassa as partes (ex.: para a resposta HTTP) gravando-as no cache.
+
+        A planilha só entra no cache se as partes chegarem até o fim.
+        """
+        caminho = self._caminho(chave)
+        temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temporario, "wb") as f:
+                for parte in partes:
+                    f.write(parte)
+                    yield parte
+            os.replace(temporario, caminho)
+        finally:
+            # se o cliente desconectou, interrompe também quem gera as partes
+            fechar = getattr(partes, "close", None)
+            if fechar is not None:
+                fechar()
+            _remover(temporario)
+        self._podar()
+
+    def _nomes(self):
+        try:
+            return os.listdir(self.pasta)
+        except OSError:
+            return []
+
+    def _podar(self):
+        arquivos = []
+        # temporários de gerações interrompidas há mais de uma hora
+        limite_temporarios = time.time() - 3600
+        for nome in self._nomes():
+            caminho = os.path.join(self.pasta, nome)
+            try:
+                usado_em = os.path.getmtime(caminho)
+            except OSError:
+                continue
+            if nome.endswith(".xlsx"):
+                arquivos.append((usado_em, caminho))
+            elif usado_em < limite_temporarios:
+                _remover(caminho)
+
+        arquivos.sort(reverse=True)
+        for _, caminho in arquivos[self.max_arquivos :]:
+            _remover(caminho)
+
+
+class PdfCache:
+    """PDFs de propostas por hash do conteúdo, em memória e em disco.
+
+    A chave é o hash de tudo o que vai no PDF (PdfReportGenerator.conteudo):
+    qualquer alteração na proposta gera outra chave, e o PDF anterior da
+    mesma proposta é descartado na hora. Os dois níveis são LRU: até
+    ``max_memoria`` bytes num OrderedDict e até ``max_disco`` bytes em
+    arquivos na pasta (a ordem de uso é o mtime, e a pasta pode ser
+    compartilhada entre os workers).
+    """
+
+    def __init__(
+        self,
+        pasta: Optional[str] = None,
+        max_memoria: int = 16 * 1024 * 1024,
+        max_disco: int = 256 * 1024 * 1024,
+    ):
+        self.pasta = pasta or os.path.join(tempfile.gettempdir(), "dealflow_cache", "pdf")
+        self.max_memoria = max_memoria
+        self.max_disco = max_disco
+        os.makedirs(self.pasta, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._memoria: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes_memoria = 0
+        # última chave de cada proposta, para descartar o PDF antigo
+        self._por_proposta: Dict[int, str] = {}
+        # estimativa do tamanho da pasta; só é recontada ao podar
+        self._bytes_disco = sum(tamanho for _, tamanho, _ in self._arquivos())
+
+        self.acertos_memoria = 0
+        self.acertos_disco = 0
+        self.faltas = 0
+
+    @staticmethod
+    def chave(conteudo: Any) -> str:
+        dados = json.dumps(conteudo, default=str, ensure_ascii=False)
+        return hashlib.sha256(dados.encode("utf-8")).hexdigest()
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.pasta, f"{chave}.pdf")
+
+    def obter(self, proposta_id: int, chave: str, gerar: Callable[[], bytes]) -> bytes:
+        """PDF da chave; se não estiver em nenhum nível, usa gerar() e guarda."""
+        with self._lock:
+            anterior = self._por_proposta.get(proposta_id)
+            self._por_proposta[proposta_id] = chave
+            if anterior is not None and anterior != chave:
+                self._descartar(anterior)
+
+            dados = self._memoria.get(chave)
+            if dados is not None:
+                self._memoria.move_to_end(chave)
+                self.acertos_memoria += 1
+                return dados
+
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, "rb") as f:
+                dados = f.read()
+            os.utime(caminho)
+        except OSError:
+            dados = None
+
+        if dados is not None:
+            with self._lock:
+                self.acertos_disco += 1
+                self._guardar_memoria(chave, dados)
+            return dados
+
+        dados = gerar()
+        self._guardar_disco(chave, dados)
+        with self._lock:
+            self.faltas += 1
+            self._guardar_memoria(chave, dados)
+        return dados
+
+    def invalidar(self, proposta_id: int):
+        """Descarta o PDF guardado da proposta (ex.: ao excluí-la)."""
+        with self._lock:
+            chave = self._por_proposta.pop(proposta_id, None)
+            if chave is not None:
+                self._descartar(chave)
+
+    def estatisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "acertos_memoria": self.acertos_memoria,
+                "acertos_disco": self.acertos_disco,
+                "faltas": self.faltas,
+                "itens_memoria": len(self._memoria),
+                "bytes_memoria": self._bytes_memoria,
+                "bytes_disco": self._bytes_disco,
+            }
+
+    def _descartar(self, chave: str):
+        # chamado com self._lock
+        dados = self._memoria.pop(chave, None)
+        if dados is not None:
+            self._bytes_memoria -= len(dados)
+        try:
+            tamanho = os.path.getsize(self._caminho(chave))
+            os.remove(self._caminho(chave))
+            self._bytes_disco -= tamanho
+        except OSError:
+            pass
+
+    def _guardar_memoria(self, chave: str, dados: bytes):
+        # chamado com self._lock
+        if len(dados) > self.max_memoria or chave in self._memoria:
+            return
+        self._memoria[chave] = dados
+        self._bytes_memoria += len(dados)
+        while self._bytes_memoria > self.max_memoria:
+            _, antigo = self._memoria.popitem(last=False)
+            self._bytes_memoria -= len(antigo)
+
+    def _guardar_disco(self, chave: str, dados: bytes):
+        caminho = self._caminho(chave)
+        temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temporario, "wb") as f:
+                f.write(dados)
+            os.replace(temporario, caminho)
+        except OSError:
+            # sem disco o cache em memória ainda vale
+            _remover(temporario)
+            return
+        with self._lock:
+            self._bytes_disco += len(dados)
+            podar = self._bytes_disco > self.max_disco
+        if podar:
+            self._podar_disco()
+
+    def _arquivos(self):
+        try:
+            nomes = os.listdir(self.pasta)
+        except OSError:
+            return
+        for nome in nomes:
+            if not nome.endswith(".pdf"):
+                continue
+            caminho = os.path.join(self.pasta, nome)
+            try:
+                estado = os.stat(caminho)
+            except OSError:
+                continue
+            yield estado.st_mtime, estado.st_size, caminho
+
+    def _podar_disco(self):
+        # reconta a pasta (outros workers também gravam nela) e remove os
+        # usados há mais tempo até sobrar 90% do limite
+        arquivos = sorted(self._arquivos())
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        alvo = self.max_disco * 0.9
+        for _, tamanho, caminho in arquivos:
+            if total <= alvo:
+                break
+            _remover(caminho)
+            total -= tamanho
+        with self._lock:
+            self._bytes_disco = total
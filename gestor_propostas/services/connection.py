@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import threading
+import weakref
+from typing import List
+
+
+class _Reserva:
+    """Guarda a conexão da thread; quando a thread termina, ela volta ao pool."""
+
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+
+class ConnectionManager:
+    """Mantém uma conexão SQLite por thread, reaproveitada entre requisições."""
+
+    PRAGMAS = (
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA cache_size = -16000",      # ~16 MB de cache de páginas
+        "PRAGMA mmap_size = 134217728",    # 128 MB mapeados em memória
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA busy_timeout = 5000",
+        "PRAGMA foreign_keys = ON",
+    )
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._fechado = False
+        self._iniciar()
+        _gerenciadores.add(self)
+
+    def _iniciar(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conexoes: List[sqlite3.Connection] = []
+        self._livres: List[sqlite3.Connection] = []
+
+    def _apos_fork(self):
+        # o SQLite proíbe usar no filho uma conexão aberta antes do fork, e
+        # fechá-la aqui soltaria os locks POSIX do pai: as herdadas ficam
+        # guardadas, sem uso, e o filho abre as suas
+        _herdadas.extend(self._conexoes)
+        self._iniciar()
+
+    def _abrir(self) -> sqlite3.Connection:
+        # check_same_thread=False porque a conexão pode mudar de dono quando
+        # uma thread termina; em uso ela nunca é compartilhada entre threads
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def obter(self) -> sqlite3.Connection:
+        reserva = getattr(self._local, "reserva", None)
+        if reserva is not None:
+            return reserva.conn
+
+        with self._lock:
+            conn = self._livres.pop() if self._livres else None
+        if conn is None:
+            conn = self._abrir()
+            with self._lock:
+                self._conexoes.append(conn)
+
+        reserva = _Reserva(conn)
+        # servidores que criam uma thread por requisição (ex.: o de
+        # desenvolvimento do Flask) devolvem a conexão ao pool ao terminar
+        weakref.finalize(reserva, self._devolver, conn)
+        self._local.reserva = reserva
+        return conn
+
+    def _devolver(self, conn: sqlite3.Connection):
+        with self._lock:
+            # conexão fechada, ou herdada de antes de um fork
+            if self._fechado or conn not in self._conexoes:
+                return
+            if conn.in_transaction:
+                conn.rollback()
+            self._livres.append(conn)
+
+    def fechar_todas(self):
+        with self._lock:
+            self._fechado = True
+            conexoes, self._conexoes = self._conexoes, []
+            self._livres = []
+
+        for conn in conexoes:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+_gerenciadores: "weakref.WeakSet[ConnectionManager]" = weakref.WeakSet()
+_herdadas: List[sqlite3.Connection] = []
+
+
+def _descartar_conexoes_apos_fork():
+    for gerenciador in list(_gerenciadores):
+        gerenciador._apos_fork()
+
+
+os.register_at_fork(after_in_child=_descartar_conexoes_apos_fork)
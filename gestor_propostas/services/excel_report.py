@@ -1,49 +1,119 @@
 import os
-import tempfile
-from datetime import datetime
+import queue
+import threading
+from contextlib import nullcontext
+from itertools import chain, islice
+from typing import IO, Callable, ContextManager, Iterable, Iterator, List, Optional, Union
 
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Alignment, Font
+from openpyxl.utils import get_column_letter
+# arquivos temporários das abas write-only (o openpyxl apaga os que
+# sobrarem só ao encerrar o processo)
+from openpyxl.worksheet._writer import ALL_TEMP_FILES
 
 class ExcelReportGenerator:
+    # Cabeçalho
+    COLUNAS = [
+        "ID Proposta",
+        "Título",
+        "Cliente",
+        "Documento cliente",
+        "Contato cliente",
+        "Status",
+        "Data criação",
+        "Responsável",
+        "Validade",
+        "Condições de pagamento",
+        "Subtotal (R$)",
+        "Desconto (R$)",
+        "Total (R$)",
+    ]
+
+    # No modo write-only as larguras das colunas vão para o arquivo antes da
+    # primeira linha; elas são medidas nas primeiras linhas, guardadas só
+    # até esse ponto, e o restante segue direto para o arquivo.
+    AMOSTRA_LARGURAS = 1000
+
+    # tamanho dos pedaços entregues por gerar_excel_em_partes
+    TAMANHO_PARTE = 64 * 1024
+
+    # de quantas em quantas linhas o callback de progresso é chamado
+    PASSO_PROGRESSO = 500
+
     @classmethod
-    def gerar_excel(cls, gestor, caminho: str | None = None) -> str:
-        if not caminho:
-            fd, caminho = tempfile.mkstemp(
-                suffix=".xlsx", prefix="dealflow_propostas_"
-            )
-            os.close(fd)
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Propostas"
-
-        # Cabeçalho
-        headers = [
-            "ID Proposta",
-            "Título",
-            "Cliente",
-            "Documento cliente",
-            "Contato cliente",
-            "Status",
-            "Data criação",
-            "Responsável",
-            "Validade",
-            "Condições de pagamento",
-            "Subtotal (R$)",
-            "Desconto (R$)",
-            "Total (R$)",
-        ]
-        ws.append(headers)
+    def gerar_excel(
+        cls,
+        gestor,
+        destino: Union[str, IO[bytes]],
+        propostas=None,
+        bloqueio: Optional[Callable[[], ContextManager]] = None,
+        progresso: Optional[Callable[[int], None]] = None,
+    ):
+        """Grava a planilha em destino: um caminho ou qualquer arquivo
+        binário aberto para escrita (BytesIO, o stream da resposta...).
+        O arquivo não é fechado.
+
+        No modo write-only o openpyxl grava o XML da aba num arquivo
+        temporário próprio (openpyxl.*, na pasta temporária do sistema),
+        do tamanho da aba sem compactação; só ao salvar ele é compactado
+        em destino. O arquivo é apagado no fim, mesmo com erro.
+
+        propostas: as propostas a exportar; por padrão, todas do gestor.
+        bloqueio (ex.: gestor.leitura) é mantido só enquanto as propostas
+        são lidas; a compactação e a escrita em destino ficam fora dele.
+        progresso recebe o número de linhas já escritas.
+        """
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Propostas")
+        try:
+            with (bloqueio or nullcontext)():
+                propostas = gestor.listar_propostas() if propostas is None else propostas
+                cls._preencher(ws, propostas, progresso)
+            wb.save(destino)
+        finally:
+            _apagar_temporario(ws)
+
+    @classmethod
+    def _preencher(
+        cls, ws, propostas: Iterable, progresso: Optional[Callable[[int], None]] = None
+    ):
+        linhas = cls._linhas(propostas)
+        amostra = list(islice(linhas, cls.AMOSTRA_LARGURAS))
+
+        larguras = [len(titulo) for titulo in cls.COLUNAS]
+        for linha in amostra:
+            for i, valor in enumerate(linha):
+                tamanho = len(str(valor))
+                if tamanho > larguras[i]:
+                    larguras[i] = tamanho
+        for i, tamanho in enumerate(larguras, 1):
+            ws.column_dimensions[get_column_letter(i)].width = max(10, min(tamanho + 2, 50))
 
         # Estilo do cabeçalho
         header_font = Font(bold=True)
-        for cell in ws[1]:
+        header_alignment = Alignment(horizontal="center")
+        cabecalho = []
+        for titulo in cls.COLUNAS:
+            cell = WriteOnlyCell(ws, value=titulo)
             cell.font = header_font
-            cell.alignment = Alignment(horizontal="center")
+            cell.alignment = header_alignment
+            cabecalho.append(cell)
+        ws.append(cabecalho)
 
         # Linhas de dados
-        for p in gestor.listar_propostas():
+        escritas = 0
+        for escritas, linha in enumerate(chain(amostra, linhas), 1):
+            ws.append(linha)
+            if progresso is not None and escritas % cls.PASSO_PROGRESSO == 0:
+                progresso(escritas)
+        if progresso is not None:
+            progresso(escritas)
+
+    @staticmethod
+    def _linhas(propostas: Iterable) -> Iterator[List]:
+        for p in propostas:
             subtotal = p.calcular_subtotal()
             total = p.calcular_total()
             desconto = subtotal - total
@@ -57,36 +127,131 @@ class ExcelReportGenerator:
                 p.validade.strftime("%d/%m/%Y") if p.validade else ""
             )
 
-            ws.append(
-                [
-                    p.id,
-                    p.titulo,
-                    p.cliente.nome,
-                    p.cliente.documento,
-                    p.cliente.contato,
-                    p.status,
-                    data_criacao_str,
-                    p.responsavel or "",
-                    validade_str,
-                    p.condicoes_pagamento or "",
-                    float(subtotal),
-                    float(desconto),
-                    float(total),
-                ]
-            )
+            yield [
+                p.id,
+                p.titulo,
+                p.cliente.nome,
+                p.cliente.documento,
+                p.cliente.contato,
+                p.status,
+                data_criacao_str,
+                p.responsavel or "",
+                validade_str,
+                p.condicoes_pagamento or "",
+                float(subtotal),
+                float(desconto),
+                float(total),
+            ]
+
+    @classmethod
+    def gerar_excel_em_partes(
+        cls,
+        gestor,
+        propostas=None,
+        bloqueio: Optional[Callable[[], ContextManager]] = None,
+    ) -> Iterator[bytes]:
+        """Gera a planilha numa thread e devolve os bytes conforme ficam prontos.
+
+        Serve para mandar o arquivo na resposta HTTP sem montá-lo inteiro
+        em memória. O openpyxl grava antes toda a aba no arquivo
+        temporário dele (ver gerar_excel): as partes só começam a sair
+        depois disso, perto do fim da geração. Se o consumidor parar no
+        meio (cliente desconectou), a geração é interrompida.
+        """
+        partes: "queue.Queue" = queue.Queue(maxsize=8)
+        cancelado = threading.Event()
+
+        def produzir():
+            try:
+                saida = _SaidaEmPartes(partes, cancelado, cls.TAMANHO_PARTE)
+                cls.gerar_excel(gestor, saida, propostas, bloqueio)
+                saida.flush()
+                fim = None
+            except _GeracaoCancelada:
+                return
+            except BaseException as erro:
+                fim = erro
+            # o consumidor pode ter ido embora com a fila cheia
+            _colocar(partes, cancelado, fim)
+
+        threading.Thread(target=produzir, name="excel-em-partes", daemon=True).start()
+        try:
+            while True:
+                parte = partes.get()
+                if parte is None:
+                    return
+                if isinstance(parte, BaseException):
+                    raise parte
+                yield parte
+        finally:
+            cancelado.set()
+
+
+def _apagar_temporario(ws):
+    # o openpyxl só apaga o arquivo da aba quando salva até o fim; numa
+    # geração interrompida (erro, download cancelado) ele ficaria na pasta
+    # temporária até o processo encerrar
+    escritor = ws._writer
+    if escritor is None or escritor.out not in ALL_TEMP_FILES:
+        return
+    try:
+        if ws._rows is not None:
+            ws._rows.close()
+        escritor.close()
+    except Exception:
+        # o arquivo pode ter ficado pela metade: basta apagá-lo
+        pass
+    ALL_TEMP_FILES.remove(escritor.out)
+    try:
+        os.remove(escritor.out)
+    except OSError:
+        pass
+
+
+class _GeracaoCancelada(Exception):
+    pass
+
+
+def _colocar(partes: "queue.Queue", cancelado: threading.Event, item) -> bool:
+    """Põe item na fila sem travar para sempre: desiste (False) se o
+    consumidor cancelou enquanto a fila estava cheia."""
+    while not cancelado.is_set():
+        try:
+            partes.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+class _SaidaEmPartes:
+    """Arquivo só de escrita que entrega os bytes em pedaços numa fila.
+
+    Sem seek/tell: o zipfile detecta e grava o .xlsx em modo streaming.
+    """
+
+    def __init__(self, partes: "queue.Queue", cancelado: threading.Event, tamanho: int):
+        self._partes = partes
+        self._cancelado = cancelado
+        self._tamanho = tamanho
+        self._buffer = bytearray()
+        self._descartando = False
+
+    def write(self, dados) -> int:
+        if self._descartando:
+            return len(dados)
+        self._buffer += dados
+        if len(self._buffer) >= self._tamanho:
+            self._enviar()
+        return len(dados)
 
+    def flush(self):
+        if self._buffer and not self._descartando:
+            self._enviar()
 
-        for col in ws.columns:
-            max_len = 0
-            col_letter = col[0].column_letter
-            for cell in col:
-                try:
-                    value = str(cell.value) if cell.value is not None else ""
-                    if len(value) > max_len:
-                        max_len = len(value)
-                except Exception:
-                    pass
-            ws.column_dimensions[col_letter].width = max(10, min(max_len + 2, 50))
-
-        wb.save(caminho)
-        return caminho
+    def _enviar(self):
+        parte, self._buffer = bytes(self._buffer), bytearray()
+        if not _colocar(self._partes, self._cancelado, parte):
+            # o que o zipfile ainda tentar gravar ao ser coletado é ignorado
+            self._descartando = True
+            raise _GeracaoCancelada()
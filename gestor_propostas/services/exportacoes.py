@@ -0,0 +1,237 @@
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, BinaryIO, Dict, List, Optional
+
+from .cache import ExcelCache
+from .excel_report import ExcelReportGenerator
+
+logger = logging.getLogger(__name__)
+
+_ID_VALIDO = re.compile(r"[0-9a-f]{32}")
+
+# estados de uma exportação
+NA_FILA = "na_fila"
+EXECUTANDO = "executando"
+PRONTA = "pronta"
+# nenhuma proposta no filtro: não há planilha para baixar
+VAZIA = "vazia"
+ERRO = "erro"
+
+
+def selecionar_propostas(
+    gestor,
+    q: str = "",
+    status: str = "",
+    de: Optional[date] = None,
+    ate: Optional[date] = None,
+) -> List:
+    """Propostas do filtro do dashboard (q, status), criadas entre de e ate
+    (inclusive). Chamar segurando a leitura do gestor."""
+    propostas = gestor.filtrar_propostas(status=status, q=q)
+    if de or ate:
+        propostas = [
+            p
+            for p in propostas
+            if (de is None or p.data_criacao.date() >= de)
+            and (ate is None or p.data_criacao.date() <= ate)
+        ]
+    return propostas
+
+
+class ExportJobs:
+    """Exportações de planilha em segundo plano.
+
+    Cada exportação roda num pool de threads, grava o estado e o progresso
+    em <id>.json na pasta e deixa a planilha no cache, sob a chave
+    recebida em enviar (se ela já estiver lá, a exportação nasce pronta).
+    Como tudo fica em disco, qualquer worker que use as mesmas pastas
+    responde a consulta e entrega o arquivo. Estados com mais de
+    ``validade`` segundos são apagados a cada nova exportação.
+    """
+
+    def __init__(
+        self,
+        gestor,
+        cache: ExcelCache,
+        pasta: Optional[str] = None,
+        trabalhadores: int = 2,
+        validade: float = 3600,
+    ):
+        self.gestor = gestor
+        self.cache = cache
+        self.pasta = pasta or os.path.join(tempfile.gettempdir(), "dealflow_exportacoes")
+        self.trabalhadores = trabalhadores
+        self.validade = validade
+        os.makedirs(self.pasta, exist_ok=True)
+        # criado na primeira exportação (e de novo em processos filhos)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._criando_pool = threading.Lock()
+        # exportações deste processo ainda não terminadas, por id
+        self._ativas: Dict[str, Dict[str, Any]] = {}
+        _exportacoes.add(self)
+
+    def _caminho(self, job_id: str) -> str:
+        return os.path.join(self.pasta, f"{job_id}.json")
+
+    def _salvar(self, estado: Dict[str, Any]):
+        # grava e troca de uma vez: quem consulta nunca lê um JSON pela metade
+        caminho = self._caminho(estado["id"])
+        with open(caminho + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(estado, f)
+        os.replace(caminho + ".tmp", caminho)
+
+    def enviar(
+        self,
+        usuario: str,
+        chave: str,
+        q: str = "",
+        status: str = "",
+        de: Optional[date] = None,
+        ate: Optional[date] = None,
+    ) -> Dict[str, Any]:
+        """Agenda uma exportação e devolve o estado inicial.
+
+        chave: chave da planilha no cache (ExcelCache.chave).
+        """
+        self.limpar()
+        estado = {
+            "id": uuid.uuid4().hex,
+            "usuario": usuario,
+            "chave": chave,
+            "filtros": {
+                "q": q,
+                "status": status,
+                "de": de.isoformat() if de else None,
+                "ate": ate.isoformat() if ate else None,
+            },
+            "estado": NA_FILA,
+            "processadas": 0,
+            "total": None,
+            "criada_em": datetime.now().isoformat(timespec="seconds"),
+            "erro": None,
+        }
+        if self.cache.obter(chave) is not None:
+            estado["estado"] = PRONTA
+        self._salvar(estado)
+        if estado["estado"] == PRONTA:
+            return estado
+
+        with self._criando_pool:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.trabalhadores, thread_name_prefix="exportacao"
+                )
+            self._ativas[estado["id"]] = estado
+        self._pool.submit(self._executar, estado, q, status, de, ate)
+        return estado
+
+    def _executar(self, estado, q, status, de, ate):
+        gestor = self.gestor
+        try:
+            with gestor.leitura():
+                propostas = selecionar_propostas(gestor, q, status, de, ate)
+            if not propostas:
+                estado.update(estado=VAZIA, total=0)
+                self._salvar(estado)
+                return
+            estado.update(estado=EXECUTANDO, total=len(propostas))
+            self._salvar(estado)
+
+            def progresso(processadas: int):
+                estado["processadas"] = processadas
+                self._salvar(estado)
+
+            self.cache.guardar(
+                estado["chave"],
+                lambda destino: ExcelReportGenerator.gerar_excel(
+                    gestor,
+                    destino,
+                    propostas=propostas,
+                    bloqueio=gestor.leitura,
+                    progresso=progresso,
+                ),
+            )
+            estado["estado"] = PRONTA
+        except Exception as erro:
+            logger.exception("Falha na exportação %s", estado["id"])
+            estado.update(estado=ERRO, erro=str(erro) or type(erro).__name__)
+        finally:
+            with self._criando_pool:
+                self._ativas.pop(estado["id"], None)
+        self._salvar(estado)
+
+    def consultar(self, job_id: str, usuario: str) -> Optional[Dict[str, Any]]:
+        """Estado da exportação, ou None se não existir ou for de outro usuário."""
+        if not _ID_VALIDO.fullmatch(job_id):
+            return None
+        try:
+            with open(self._caminho(job_id), encoding="utf-8") as f:
+                estado = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if estado.get("usuario") != usuario:
+            return None
+        return estado
+
+    def arquivo(self, estado: Dict[str, Any]) -> Optional[BinaryIO]:
+        """Planilha da exportação aberta para leitura, ou None se ainda não
+        estiver pronta (ou se já tiver saído do cache)."""
+        if estado["estado"] != PRONTA:
+            return None
+        return self.cache.abrir(estado["chave"])
+
+    def limpar(self):
+        """Apaga estados com mais de ``validade`` segundos."""
+        limite = time.time() - self.validade
+        try:
+            nomes = os.listdir(self.pasta)
+        except OSError:
+            return
+        for nome in nomes:
+            caminho = os.path.join(self.pasta, nome)
+            try:
+                if os.path.getmtime(caminho) < limite:
+                    os.remove(caminho)
+            except OSError:
+                # outro worker apagou antes
+                pass
+
+    def parar(self):
+        """Termina as exportações em andamento e encerra as que estavam na fila."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        # as canceladas nunca rodaram: sem isso ficariam "na_fila" e o
+        # navegador continuaria consultando
+        with self._criando_pool:
+            canceladas, self._ativas = list(self._ativas.values()), {}
+        for estado in canceladas:
+            estado.update(estado=ERRO, erro="Exportação cancelada: o servidor foi encerrado.")
+            try:
+                self._salvar(estado)
+            except OSError:
+                logger.exception("Falha ao encerrar a exportação %s", estado["id"])
+
+
+_exportacoes: "weakref.WeakSet[ExportJobs]" = weakref.WeakSet()
+
+
+def _descartar_pools_apos_fork():
+    # as threads do pool não sobrevivem ao fork; o filho cria o seu
+    for exportacoes in list(_exportacoes):
+        exportacoes._pool = None
+        exportacoes._criando_pool = threading.Lock()
+        # as do pai continuam sendo dele
+        exportacoes._ativas = {}
+
+
+os.register_at_fork(after_in_child=_descartar_pools_apos_fork)
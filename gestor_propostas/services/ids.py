@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import threading
+import weakref
+from functools import partial
+from typing import Callable, Dict, Iterator, Optional
+
+from .connection import _herdadas
+
+
+class IdAllocator:
+    """Distribui ids de clientes e propostas a partir da tabela sequencias.
+
+    Cada processo reserva um bloco de ids com um único UPDATE ... RETURNING,
+    que o SQLite executa de forma atômica: dois processos nunca recebem o
+    mesmo bloco. Dentro do bloco os ids saem da memória, sem ir ao banco.
+    Ids de blocos não usados até o processo encerrar ficam como lacunas.
+    """
+
+    TAMANHO_BLOCO = 64
+
+    def __init__(self, db_path: str, tamanho_bloco: Optional[int] = None):
+        self.db_path = db_path
+        self.tamanho_bloco = tamanho_bloco or self.TAMANHO_BLOCO
+        self._blocos: Dict[str, Iterator[int]] = {}
+        # só serializa a troca de bloco, e só dentro deste processo
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        _alocadores.add(self)
+
+    def _conexao(self) -> sqlite3.Connection:
+        # conexão própria em autocommit: a reserva não pode entrar (nem
+        # fazer commit) na transação que a thread chamadora tiver aberta
+        if self._conn is None:
+            self._conn = sqlite3.connect(
+                self.db_path, timeout=5, isolation_level=None, check_same_thread=False
+            )
+        return self._conn
+
+    def _reservar(self, sequencia: str) -> range:
+        linhas = self._conexao().execute(
+            "UPDATE sequencias SET proximo = proximo + ? WHERE nome = ? RETURNING proximo",
+            (self.tamanho_bloco, sequencia),
+        ).fetchall()
+        if not linhas:
+            raise LookupError(f"Sequência de ids desconhecida: {sequencia}")
+        fim = linhas[0][0]
+        return range(fim - self.tamanho_bloco, fim)
+
+    def proximo(self, sequencia: str) -> int:
+        # caminho comum sem lock: next() de um iterador de range é atômico
+        bloco = self._blocos.get(sequencia)
+        if bloco is not None:
+            novo_id = next(bloco, None)
+            if novo_id is not None:
+                return novo_id
+
+        with self._lock:
+            # outra thread pode ter trocado o bloco enquanto esperávamos
+            bloco = self._blocos.get(sequencia)
+            novo_id = next(bloco, None) if bloco is not None else None
+            if novo_id is None:
+                bloco = iter(self._reservar(sequencia))
+                self._blocos[sequencia] = bloco
+                novo_id = next(bloco)
+            return novo_id
+
+    def gerador(self, sequencia: str) -> Callable[[], int]:
+        return partial(self.proximo, sequencia)
+
+    def _apos_fork(self):
+        # o filho herdaria os mesmos blocos do pai e repetiria os ids; a
+        # conexão herdada não é usada nem fechada (ver connection._herdadas)
+        self._blocos = {}
+        self._lock = threading.Lock()
+        if self._conn is not None:
+            _herdadas.append(self._conn)
+        self._conn = None
+
+    def fechar(self):
+        with self._lock:
+            self._blocos = {}
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_alocadores: "weakref.WeakSet[IdAllocator]" = weakref.WeakSet()
+
+
+def _descartar_blocos_apos_fork():
+    for alocador in list(_alocadores):
+        alocador._apos_fork()
+
+
+os.register_at_fork(after_in_child=_descartar_blocos_apos_fork)
@@ -0,0 +1,302 @@
+import sqlite3
+import uuid
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+# Cada migração recebe um cursor dentro de uma transação já aberta e roda
+# uma única vez; a versão aplicada fica registrada em schema_version.
+# Novas alterações de schema entram sempre no fim da lista, com a próxima
+# versão — nunca edite uma migração que já foi publicada.
+Migracao = Tuple[int, str, Callable[[sqlite3.Cursor], None]]
+
+MIGRACOES: List[Migracao] = []
+
+
+def migracao(versao: int, descricao: str):
+    def registrar(func: Callable[[sqlite3.Cursor], None]):
+        MIGRACOES.append((versao, descricao, func))
+        return func
+
+    return registrar
+
+
+@migracao(1, "tabelas iniciais")
+def _tabelas_iniciais(cur: sqlite3.Cursor):
+    # IF NOT EXISTS: bancos criados antes das migrações já têm essas tabelas
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS clientes (
+            id INTEGER PRIMARY KEY,
+            nome TEXT NOT NULL,
+            documento TEXT,
+            contato TEXT
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS propostas (
+            id INTEGER PRIMARY KEY,
+            cliente_id INTEGER NOT NULL,
+            titulo TEXT NOT NULL,
+            data_criacao TEXT NOT NULL,
+            status TEXT NOT NULL,
+            validade TEXT,
+            responsavel TEXT,
+            condicoes_pagamento TEXT,
+            tipo_desconto TEXT,
+            desconto_percentual REAL,
+            desconto_valor REAL,
+            FOREIGN KEY (cliente_id) REFERENCES clientes(id)
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS itens (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            proposta_id INTEGER NOT NULL,
+            descricao TEXT NOT NULL,
+            quantidade INTEGER NOT NULL,
+            valor_unitario REAL NOT NULL,
+            FOREIGN KEY (proposta_id) REFERENCES propostas(id)
+        )
+        """
+    )
+
+
+@migracao(2, "índices de itens por proposta e de propostas por cliente/status")
+def _indices_consultas(cur: sqlite3.Cursor):
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_itens_proposta ON itens (proposta_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_propostas_cliente ON propostas (cliente_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_propostas_status ON propostas (status)")
+
+
+@migracao(3, "subtotal, desconto e total persistidos nas propostas")
+def _totais_persistidos(cur: sqlite3.Cursor):
+    cur.execute("ALTER TABLE propostas ADD COLUMN subtotal REAL NOT NULL DEFAULT 0")
+    cur.execute("ALTER TABLE propostas ADD COLUMN desconto REAL NOT NULL DEFAULT 0")
+    cur.execute("ALTER TABLE propostas ADD COLUMN total REAL NOT NULL DEFAULT 0")
+
+    # mesma regra de Proposta.calcular_subtotal/desconto/total
+    cur.execute(
+        """
+        UPDATE propostas
+           SET subtotal = COALESCE(
+                   (SELECT SUM(quantidade * valor_unitario)
+                      FROM itens
+                     WHERE itens.proposta_id = propostas.id),
+                   0)
+        """
+    )
+    cur.execute(
+        """
+        UPDATE propostas
+           SET desconto = CASE tipo_desconto
+                              WHEN '%' THEN subtotal * COALESCE(desconto_percentual, 0) / 100.0
+                              WHEN 'R' THEN COALESCE(desconto_valor, 0)
+                              ELSE 0
+                          END
+        """
+    )
+    cur.execute("UPDATE propostas SET total = MAX(0.0, subtotal - desconto)")
+
+    # cobre SUM(total) ... GROUP BY status sem ler a tabela
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_propostas_status_total ON propostas (status, total)"
+    )
+
+
+def _fts5_disponivel(cur: sqlite3.Cursor) -> bool:
+    try:
+        cur.execute("CREATE VIRTUAL TABLE temp._teste_fts5 USING fts5(x)")
+        cur.execute("DROP TABLE temp._teste_fts5")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+@migracao(4, "índice de texto completo (FTS5) das propostas")
+def _busca_textual(cur: sqlite3.Cursor):
+    if not _fts5_disponivel(cur):
+        # SQLite compilado sem FTS5: a busca continua funcionando via LIKE
+        return
+
+    # um documento por proposta; remove_diacritics ignora acentos na busca
+    cur.execute(
+        """
+        CREATE VIRTUAL TABLE propostas_busca USING fts5(
+            titulo, cliente, responsavel, itens,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO propostas_busca (rowid, titulo, cliente, responsavel, itens)
+        SELECT p.id, p.titulo, c.nome, p.responsavel,
+               (SELECT group_concat(i.descricao, ' ') FROM itens i WHERE i.proposta_id = p.id)
+          FROM propostas p
+          JOIN clientes c ON c.id = p.cliente_id
+        """
+    )
+
+    # gatilhos mantêm o índice em dia com qualquer escrita do StorageManager
+    cur.execute(
+        """
+        CREATE TRIGGER propostas_busca_ai AFTER INSERT ON propostas BEGIN
+            INSERT INTO propostas_busca (rowid, titulo, cliente, responsavel, itens)
+            VALUES (
+                new.id, new.titulo,
+                (SELECT nome FROM clientes WHERE id = new.cliente_id),
+                new.responsavel,
+                (SELECT group_concat(descricao, ' ') FROM itens WHERE proposta_id = new.id)
+            );
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER propostas_busca_au AFTER UPDATE OF titulo, responsavel, cliente_id ON propostas
+        WHEN old.titulo IS NOT new.titulo
+          OR old.responsavel IS NOT new.responsavel
+          OR old.cliente_id IS NOT new.cliente_id
+        BEGIN
+            UPDATE propostas_busca
+               SET titulo = new.titulo,
+                   responsavel = new.responsavel,
+                   cliente = (SELECT nome FROM clientes WHERE id = new.cliente_id)
+             WHERE rowid = new.id;
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER propostas_busca_ad AFTER DELETE ON propostas BEGIN
+            DELETE FROM propostas_busca WHERE rowid = old.id;
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER clientes_busca_au AFTER UPDATE OF nome ON clientes
+        WHEN old.nome IS NOT new.nome
+        BEGIN
+            UPDATE propostas_busca
+               SET cliente = new.nome
+             WHERE rowid IN (SELECT id FROM propostas WHERE cliente_id = new.id);
+        END
+        """
+    )
+    for nome, evento, ref in (
+        ("itens_busca_ai", "AFTER INSERT ON itens", "new"),
+        ("itens_busca_ad", "AFTER DELETE ON itens", "old"),
+        ("itens_busca_au", "AFTER UPDATE OF descricao ON itens", "new"),
+    ):
+        cur.execute(
+            f"""
+            CREATE TRIGGER {nome} {evento} BEGIN
+                UPDATE propostas_busca
+                   SET itens = (SELECT group_concat(descricao, ' ')
+                                  FROM itens WHERE proposta_id = {ref}.proposta_id)
+                 WHERE rowid = {ref}.proposta_id;
+            END
+            """
+        )
+
+
+@migracao(5, "índices para paginação por (data_criacao, id)")
+def _indices_paginacao(cur: sqlite3.Cursor):
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_propostas_criacao ON propostas (data_criacao, id)"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_propostas_status_criacao "
+        "ON propostas (status, data_criacao, id)"
+    )
+
+
+@migracao(6, "log de alterações para sincronizar vários processos")
+def _log_alteracoes(cur: sqlite3.Cursor):
+    # só cresce: cada escrita do StorageManager registra o que mudou e
+    # em qual processo; os demais aplicam as entradas com seq acima da sua
+    cur.execute(
+        """
+        CREATE TABLE alteracoes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entidade TEXT NOT NULL,
+            entidade_id INTEGER NOT NULL,
+            origem TEXT NOT NULL,
+            registrada_em TEXT NOT NULL
+        )
+        """
+    )
+
+
+@migracao(7, "sequências de ids de clientes e propostas")
+def _sequencias(cur: sqlite3.Cursor):
+    # próximo id livre de cada tabela; os processos reservam blocos daqui
+    # (ver services/ids.py) em vez de contar a partir do MAX(id) carregado
+    cur.execute(
+        """
+        CREATE TABLE sequencias (
+            nome TEXT PRIMARY KEY,
+            proximo INTEGER NOT NULL
+        )
+        """
+    )
+    for tabela in ("clientes", "propostas"):
+        cur.execute(
+            f"INSERT INTO sequencias (nome, proximo) SELECT ?, COALESCE(MAX(id), 0) + 1 FROM {tabela}",
+            (tabela,),
+        )
+
+
+@migracao(8, "identidade do banco")
+def _identidade(cur: sqlite3.Cursor):
+    # token aleatório, único por banco: a numeração do log de alterações
+    # recomeça num banco recriado, e caches em disco chaveados pela versão
+    # (ver services/cache.py) precisam distinguir um banco do outro
+    cur.execute("CREATE TABLE identidade (token TEXT NOT NULL)")
+    cur.execute("INSERT INTO identidade (token) VALUES (?)", (uuid.uuid4().hex,))
+
+
+def versao_atual(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT MAX(versao) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def aplicar_migracoes(conn: sqlite3.Connection) -> int:
+    """Aplica as migrações pendentes e devolve a versão final do schema."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            versao INTEGER PRIMARY KEY,
+            descricao TEXT NOT NULL,
+            aplicada_em TEXT NOT NULL
+        )
+        """
+    )
+    conn.commit()
+
+    for versao, descricao, func in sorted(MIGRACOES, key=lambda m: m[0]):
+        # BEGIN IMMEDIATE pega o lock de escrita antes de conferir a versão,
+        # assim dois workers subindo juntos não aplicam a mesma migração
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if versao <= versao_atual(conn):
+                conn.rollback()
+                continue
+
+            cur = conn.cursor()
+            func(cur)
+            cur.execute(
+                "INSERT INTO schema_version (versao, descricao, aplicada_em) VALUES (?, ?, ?)",
+                (versao, descricao, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return versao_atual(conn)
@@ -1,3 +1,6 @@
+from io import BytesIO
+from typing import BinaryIO, Union
+
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import mm
@@ -6,9 +9,46 @@ from ..models import Proposta
 
 
 class PdfReportGenerator:
+    # mudar o desenho do PDF exige mudar a versão: ela entra na chave do cache
+    VERSAO_LAYOUT = 1
+
+    @classmethod
+    def conteudo(cls, proposta: Proposta) -> tuple:
+        """Tudo o que gerar_pdf_proposta escreve no PDF (chave do PdfCache)."""
+        cliente = proposta.cliente
+        return (
+            cls.VERSAO_LAYOUT,
+            proposta.id,
+            proposta.titulo,
+            cliente.nome,
+            cliente.documento,
+            cliente.contato,
+            proposta.status,
+            proposta.data_criacao.strftime("%d/%m/%Y %H:%M"),
+            proposta.validade.strftime("%d/%m/%Y") if proposta.validade else "",
+            proposta.responsavel,
+            proposta.condicoes_pagamento,
+            f"{proposta.calcular_subtotal():.2f}",
+            f"{proposta.calcular_desconto():.2f}",
+            f"{proposta.calcular_total():.2f}",
+            [
+                (item.descricao[:60], str(item.quantidade), f"{item.valor_unitario:.2f}", f"{item.total:.2f}")
+                for item in proposta.itens
+            ],
+        )
+
+    @classmethod
+    def gerar_pdf_bytes(cls, proposta: Proposta) -> bytes:
+        """O PDF da proposta em memória, sem passar pelo disco."""
+        buffer = BytesIO()
+        cls.gerar_pdf_proposta(proposta, buffer)
+        return buffer.getvalue()
+
     @classmethod
-    def gerar_pdf_proposta(cls, proposta: Proposta, caminho: str):
-        c = canvas.Canvas(caminho, pagesize=A4)
+    def gerar_pdf_proposta(cls, proposta: Proposta, destino: Union[str, BinaryIO]):
+        """Grava o PDF em destino: um caminho ou qualquer arquivo binário
+        aberto para escrita (BytesIO, o stream da resposta...)."""
+        c = canvas.Canvas(destino, pagesize=A4)
         largura, altura = A4
 
         margem_esquerda = 20 * mm
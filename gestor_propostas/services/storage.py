@@ -1,9 +1,17 @@
 import os
+import re
 import sqlite3
-from datetime import datetime
-from typing import Dict
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 from ..models import GestorPropostas, Cliente, Proposta, ItemProposta
+from .connection import ConnectionManager
+from .ids import IdAllocator
+from .write_behind import WriteBehindQueue, banco_ocupado
+from .migrations import aplicar_migracoes
 
 BASE_DIR = os.path.dirname(__file__)
 
@@ -11,322 +19,942 @@ BASE_DIR = os.path.dirname(__file__)
 class StorageManager:
     DB_PATH = os.path.join(BASE_DIR, "gestor_propostas.db")
 
+    _conexoes: Optional[ConnectionManager] = None
+    _ids: Optional[IdAllocator] = None
+    # gravação adiada (ver configurar_gravacao_adiada); None = síncrona
+    _fila: Optional[WriteBehindQueue] = None
+    # índice FTS5 disponível (definido em init_db)
+    _busca_textual = False
+
+    # identifica este processo no log de alterações (ver _nova_origem)
+    ORIGEM = ""
+    # identifica o banco (tabela identidade, definido em init_db)
+    IDENTIDADE_BANCO = ""
+    # entradas do log mais antigas que isso são apagadas em init_db
+    RETENCAO_ALTERACOES = timedelta(days=7)
+    _sincronizando = threading.Lock()
+    # último PRAGMA data_version visto, por conexão e gestor
+    _versoes_vistas = threading.local()
+
     @classmethod
-    def _get_conn(cls):
-        return sqlite3.connect(cls.DB_PATH)
+    def _get_conn(cls) -> sqlite3.Connection:
+        # reaproveita a conexão da thread atual em vez de abrir uma por chamada
+        if cls._conexoes is None or cls._conexoes.db_path != cls.DB_PATH:
+            cls._conexoes = ConnectionManager(cls.DB_PATH)
+        return cls._conexoes.obter()
 
     @classmethod
-    def init_db(cls):
+    def fechar_conexoes(cls):
+        # grava o que ainda estiver na fila antes de fechar as conexões
+        cls.parar_gravacao_adiada()
+        if cls._conexoes is not None:
+            cls._conexoes.fechar_todas()
+            # o próximo _get_conn abre um gerenciador novo
+            cls._conexoes = None
+        if cls._ids is not None:
+            cls._ids.fechar()
+
+    @classmethod
+    @contextmanager
+    def _transacao(cls) -> Iterator[sqlite3.Cursor]:
         conn = cls._get_conn()
-        cur = conn.cursor()
+        try:
+            yield conn.cursor()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
 
-        # Clientes
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS clientes (
-                id INTEGER PRIMARY KEY,
-                nome TEXT NOT NULL,
-                documento TEXT,
-                contato TEXT
+    @classmethod
+    def init_db(cls):
+        # o schema é versionado: ver services/migrations.py
+        conn = cls._get_conn()
+        aplicar_migracoes(conn)
+
+        # ids novos vêm do banco, em blocos: processos diferentes nunca
+        # geram o mesmo id (e o upsert nunca vira um UPDATE por engano)
+        if cls._ids is None or cls._ids.db_path != cls.DB_PATH:
+            cls._ids = IdAllocator(cls.DB_PATH)
+        Cliente.gerar_id = cls._ids.gerador("clientes")
+        Proposta.gerar_id = cls._ids.gerador("propostas")
+        cls._busca_textual = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'propostas_busca'"
+        ).fetchone() is not None
+        cls.IDENTIDADE_BANCO = conn.execute("SELECT token FROM identidade").fetchone()[0]
+
+        # poda o log, mas sempre mantém a última entrada: ela marca até onde
+        # o log foi e permite detectar gestores que ficaram para trás
+        limite = datetime.now() - cls.RETENCAO_ALTERACOES
+        with cls._transacao() as cur:
+            cur.execute(
+                """
+                DELETE FROM alteracoes
+                 WHERE registrada_em < ?
+                   AND seq < (SELECT MAX(seq) FROM alteracoes)
+                """,
+                (limite.strftime("%Y-%m-%d %H:%M:%S"),),
             )
-            """
-        )
 
-        # Propostas
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS propostas (
-                id INTEGER PRIMARY KEY,
-                cliente_id INTEGER NOT NULL,
-                titulo TEXT NOT NULL,
-                data_criacao TEXT NOT NULL,
-                status TEXT NOT NULL,
-                validade TEXT,
-                responsavel TEXT,
-                condicoes_pagamento TEXT,
-                tipo_desconto TEXT,
-                desconto_percentual REAL,
-                desconto_valor REAL,
-                FOREIGN KEY (cliente_id) REFERENCES clientes(id)
-            )
-            """
-        )
+    @classmethod
+    def sessao(cls, duravel: bool = False) -> "UnitOfWork":
+        """Unidade de trabalho para as escritas de uma rota.
 
-        # Itens
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS itens (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                proposta_id INTEGER NOT NULL,
-                descricao TEXT NOT NULL,
-                quantidade INTEGER NOT NULL,
-                valor_unitario REAL NOT NULL,
-                FOREIGN KEY (proposta_id) REFERENCES propostas(id)
-            )
-            """
-        )
+        Com a gravação adiada ligada, o flush só enfileira as operações;
+        duravel=True grava antes de devolver o controle (e grava junto o que
+        já estava na fila, para manter a ordem).
+        """
+        return UnitOfWork(cls, duravel=duravel)
 
-        conn.commit()
-        conn.close()
+    @classmethod
+    def configurar_gravacao_adiada(
+        cls,
+        gestor: GestorPropostas,
+        intervalo: float = 0.5,
+        lote_maximo: int = 500,
+    ):
+        cls.parar_gravacao_adiada()
+        cls._fila = WriteBehindQueue(
+            cls._gravar,
+            intervalo=intervalo,
+            lote_maximo=lote_maximo,
+            bloqueio=gestor.leitura,
+        )
 
     @classmethod
-    def salvar_ou_atualizar_cliente(cls, cliente: Cliente):
-        conn = cls._get_conn()
-        cur = conn.cursor()
+    def parar_gravacao_adiada(cls):
+        fila, cls._fila = cls._fila, None
+        if fila is not None:
+            fila.parar()
 
-        cur.execute("SELECT 1 FROM clientes WHERE id = ?", (cliente.id,))
-        existe = cur.fetchone() is not None
+    @classmethod
+    def _gravar(cls, operacoes: Iterable[Tuple[Callable, Tuple[Any, ...]]]):
+        """Executa as operações numa única transação e confirma nos objetos."""
+        confirmacoes = []
+        with cls._transacao() as cur:
+            for operacao, args in operacoes:
+                confirmar = operacao(cur, *args)
+                if confirmar is not None:
+                    confirmacoes.append(confirmar)
+
+        for confirmar in confirmacoes:
+            confirmar()
 
-        if not existe:
-            cur.execute(
-                """
-                INSERT INTO clientes (id, nome, documento, contato)
-                VALUES (?, ?, ?, ?)
-                """,
-                (cliente.id, cliente.nome, cliente.documento, cliente.contato),
-            )
-        else:
-            cur.execute(
-                """
-                UPDATE clientes
-                   SET nome = ?,
-                       documento = ?,
-                       contato = ?
-                 WHERE id = ?
-                """,
-                (cliente.nome, cliente.documento, cliente.contato, cliente.id),
-            )
+    # =========================================================
+    #   LOG DE ALTERAÇÕES
+    # =========================================================
+    @classmethod
+    def _registrar_alteracao(cls, cur: sqlite3.Cursor, entidade: str, entidade_id: int):
+        cur.execute(
+            """
+            INSERT INTO alteracoes (entidade, entidade_id, origem, registrada_em)
+            VALUES (?, ?, ?, ?)
+            """,
+            (entidade, entidade_id, cls.ORIGEM, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+        )
 
-        conn.commit()
-        conn.close()
+    @staticmethod
+    def _ultima_alteracao(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM alteracoes").fetchone()[0]
 
+    # =========================================================
+    #   CLIENTES
+    # =========================================================
     @classmethod
-    def deletar_cliente(cls, cliente_id: int):
-        conn = cls._get_conn()
-        cur = conn.cursor()
+    def _upsert_cliente(cls, cur: sqlite3.Cursor, cliente: Cliente):
+        cur.execute(
+            """
+            INSERT INTO clientes (id, nome, documento, contato)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE
+               SET nome = excluded.nome,
+                   documento = excluded.documento,
+                   contato = excluded.contato
+            """,
+            (cliente.id, cliente.nome, cliente.documento, cliente.contato),
+        )
+        cls._registrar_alteracao(cur, "cliente", cliente.id)
 
+    @classmethod
+    def _delete_cliente(cls, cur: sqlite3.Cursor, cliente_id: int):
         cur.execute("DELETE FROM clientes WHERE id = ?", (cliente_id,))
-
-        conn.commit()
-        conn.close()
+        cls._registrar_alteracao(cur, "cliente", cliente_id)
 
     @classmethod
-    def salvar_ou_atualizar_proposta(cls, proposta: Proposta):
-        conn = cls._get_conn()
-        cur = conn.cursor()
+    def salvar_ou_atualizar_cliente(cls, cliente: Cliente, duravel: bool = False):
+        with cls.sessao(duravel) as sessao:
+            sessao.salvar_cliente(cliente)
 
-        cur.execute("SELECT 1 FROM propostas WHERE id = ?", (proposta.id,))
-        existe = cur.fetchone() is not None
+    @classmethod
+    def deletar_cliente(cls, cliente_id: int, duravel: bool = False):
+        with cls.sessao(duravel) as sessao:
+            sessao.deletar_cliente(cliente_id)
 
+    # =========================================================
+    #   PROPOSTAS
+    # =========================================================
+    @classmethod
+    def _upsert_proposta(cls, cur: sqlite3.Cursor, proposta: Proposta):
         data_criacao_str = proposta.data_criacao.strftime("%Y-%m-%d %H:%M:%S")
         validade_str = proposta.validade.strftime("%Y-%m-%d") if proposta.validade else None
 
-        if not existe:
-            cur.execute(
-                """
-                INSERT INTO propostas (
-                    id, cliente_id, titulo, data_criacao, status,
-                    validade, responsavel, condicoes_pagamento,
-                    tipo_desconto, desconto_percentual, desconto_valor
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    proposta.id,
-                    proposta.cliente.id,
-                    proposta.titulo,
-                    data_criacao_str,
-                    proposta.status,
-                    validade_str,
-                    proposta.responsavel,
-                    proposta.condicoes_pagamento,
-                    proposta.tipo_desconto,
-                    proposta.desconto_percentual,
-                    proposta.desconto_valor,
-                ),
-            )
-        else:
-            cur.execute(
-                """
-                UPDATE propostas
-                   SET cliente_id = ?,
-                       titulo = ?,
-                       data_criacao = ?,
-                       status = ?,
-                       validade = ?,
-                       responsavel = ?,
-                       condicoes_pagamento = ?,
-                       tipo_desconto = ?,
-                       desconto_percentual = ?,
-                       desconto_valor = ?
-                 WHERE id = ?
-                """,
-                (
-                    proposta.cliente.id,
-                    proposta.titulo,
-                    data_criacao_str,
-                    proposta.status,
-                    validade_str,
-                    proposta.responsavel,
-                    proposta.condicoes_pagamento,
-                    proposta.tipo_desconto,
-                    proposta.desconto_percentual,
-                    proposta.desconto_valor,
-                    proposta.id,
-                ),
+        cur.execute(
+            """
+            INSERT INTO propostas (
+                id, cliente_id, titulo, data_criacao, status,
+                validade, responsavel, condicoes_pagamento,
+                tipo_desconto, desconto_percentual, desconto_valor,
+                subtotal, desconto, total
             )
-
-        conn.commit()
-        conn.close()
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE
+               SET cliente_id = excluded.cliente_id,
+                   titulo = excluded.titulo,
+                   data_criacao = excluded.data_criacao,
+                   status = excluded.status,
+                   validade = excluded.validade,
+                   responsavel = excluded.responsavel,
+                   condicoes_pagamento = excluded.condicoes_pagamento,
+                   tipo_desconto = excluded.tipo_desconto,
+                   desconto_percentual = excluded.desconto_percentual,
+                   desconto_valor = excluded.desconto_valor,
+                   subtotal = excluded.subtotal,
+                   desconto = excluded.desconto,
+                   total = excluded.total
+            """,
+            (
+                proposta.id,
+                proposta.cliente.id,
+                proposta.titulo,
+                data_criacao_str,
+                proposta.status,
+                validade_str,
+                proposta.responsavel,
+                proposta.condicoes_pagamento,
+                proposta.tipo_desconto,
+                proposta.desconto_percentual,
+                proposta.desconto_valor,
+                *cls._totais(proposta),
+            ),
+        )
+        cls._registrar_alteracao(cur, "proposta", proposta.id)
+
+    @staticmethod
+    def _totais(proposta: Proposta) -> Tuple[float, float, float]:
+        return (
+            proposta.calcular_subtotal(),
+            proposta.calcular_desconto(),
+            proposta.calcular_total(),
+        )
 
     @classmethod
-    def deletar_proposta(cls, proposta_id: int):
-        conn = cls._get_conn()
-        cur = conn.cursor()
-
+    def _delete_proposta(cls, cur: sqlite3.Cursor, proposta_id: int):
         cur.execute("DELETE FROM itens WHERE proposta_id = ?", (proposta_id,))
         cur.execute("DELETE FROM propostas WHERE id = ?", (proposta_id,))
+        cls._registrar_alteracao(cur, "proposta", proposta_id)
 
-        conn.commit()
-        conn.close()
+    @classmethod
+    def salvar_ou_atualizar_proposta(cls, proposta: Proposta, duravel: bool = False):
+        with cls.sessao(duravel) as sessao:
+            sessao.salvar_proposta(proposta)
+
+    @classmethod
+    def deletar_proposta(cls, proposta_id: int, duravel: bool = False):
+        with cls.sessao(duravel) as sessao:
+            sessao.deletar_proposta(proposta_id)
 
     # =========================================================
     #   ITENS
     # =========================================================
     @classmethod
-    def sincronizar_itens_proposta(cls, proposta: Proposta):
-        conn = cls._get_conn()
-        cur = conn.cursor()
+    def _sync_itens(cls, cur: sqlite3.Cursor, proposta: Proposta) -> Callable[[], None]:
+        if not proposta.itens_carregados():
+            # modo sob demanda: itens nunca lidos não podem ter mudado
+            return lambda: None
+
+        # grava apenas o que mudou: remoções, itens alterados e itens novos
+        removidos = list(proposta._itens_removidos or ())
+        alterados = [i for i in proposta.itens if i.id is not None and i._sujo]
+        novos = [i for i in proposta.itens if i.id is None]
+
+        if removidos:
+            cur.executemany(
+                "DELETE FROM itens WHERE id = ? AND proposta_id = ?",
+                [(item_id, proposta.id) for item_id in removidos],
+            )
 
-        cur.execute("DELETE FROM itens WHERE proposta_id = ?", (proposta.id,))
+        if alterados:
+            cur.executemany(
+                """
+                UPDATE itens
+                   SET descricao = ?,
+                       quantidade = ?,
+                       valor_unitario = ?
+                 WHERE id = ?
+                """,
+                [(i.descricao, i.quantidade, i.valor_unitario, i.id) for i in alterados],
+            )
 
-        for item in proposta.itens:
-            cur.execute(
+        novos_ids: List[int] = []
+        if novos:
+            cur.executemany(
                 """
                 INSERT INTO itens (proposta_id, descricao, quantidade, valor_unitario)
                 VALUES (?, ?, ?, ?)
                 """,
-                (proposta.id, item.descricao, item.quantidade, item.valor_unitario),
+                [(proposta.id, i.descricao, i.quantidade, i.valor_unitario) for i in novos],
             )
+            # a transação detém o lock de escrita e a tabela é AUTOINCREMENT,
+            # então os ids gerados pelo executemany são consecutivos
+            ultimo_id = cur.execute("SELECT last_insert_rowid()").fetchone()[0]
+            primeiro_id = ultimo_id - len(novos) + 1
+            novos_ids = list(range(primeiro_id, ultimo_id + 1))
+
+        if removidos or alterados or novos:
+            # mantém os totais persistidos da proposta coerentes com os itens
+            cur.execute(
+                "UPDATE propostas SET subtotal = ?, desconto = ?, total = ? WHERE id = ?",
+                (*cls._totais(proposta), proposta.id),
+            )
+            cls._registrar_alteracao(cur, "proposta", proposta.id)
+
+        def confirmar():
+            # só reflete nos objetos depois do commit
+            for item, item_id in zip(novos, novos_ids):
+                item.id = item_id
+            for item in alterados:
+                item._sujo = False
+            if removidos:
+                del proposta._itens_removidos[: len(removidos)]
+
+        return confirmar
+
+    @classmethod
+    def sincronizar_itens_proposta(cls, proposta: Proposta, duravel: bool = False):
+        with cls.sessao(duravel) as sessao:
+            sessao.sincronizar_itens(proposta)
+
+    # =========================================================
+    #   LEITURA
+    # =========================================================
+    _COLUNAS_PROPOSTA = """
+        p.id, p.cliente_id, p.titulo, p.data_criacao, p.status,
+        p.validade, p.responsavel, p.condicoes_pagamento,
+        p.tipo_desconto, p.desconto_percentual, p.desconto_valor,
+        p.subtotal
+    """
+    _N_COLUNAS_PROPOSTA = 12
+
+    # linhas lidas do cursor por vez na hidratação
+    TAMANHO_LOTE = 2000
+
+    @staticmethod
+    def _ler_data_hora(valor: Optional[str]) -> datetime:
+        try:
+            return datetime.fromisoformat(valor)
+        except (TypeError, ValueError):
+            return datetime.now()
+
+    @staticmethod
+    def _ler_data(valor: Optional[str]):
+        if not valor:
+            return None
+        try:
+            return date.fromisoformat(valor)
+        except ValueError:
+            return None
+
+    @classmethod
+    def _linhas(cls, cur: sqlite3.Cursor) -> Iterator[tuple]:
+        # percorre o resultado em lotes, sem materializar a tabela inteira
+        while True:
+            lote = cur.fetchmany(cls.TAMANHO_LOTE)
+            if not lote:
+                return
+            yield from lote
+
+    @classmethod
+    def _cliente_de_linha(cls, row) -> Cliente:
+        cli_id, nome, documento, contato = row
+        return Cliente._hidratar(cli_id, nome, documento or "", contato or "")
 
-        conn.commit()
-        conn.close()
+    @classmethod
+    def _proposta_de_linha(cls, row, cliente: Cliente) -> Proposta:
+        return Proposta._hidratar(
+            id=row[0],
+            cliente=cliente,
+            titulo=row[2],
+            data_criacao=cls._ler_data_hora(row[3]),
+            status=row[4],
+            validade=cls._ler_data(row[5]),
+            responsavel=row[6] or "",
+            condicoes_pagamento=row[7] or "",
+            tipo_desconto=row[8],
+            desconto_percentual=row[9] or 0.0,
+            desconto_valor=row[10] or 0.0,
+            subtotal_salvo=row[11],
+        )
+
+    @classmethod
+    def _item_de_linha(cls, row) -> ItemProposta:
+        item_id, _proposta_id, descricao, quantidade, valor_unitario = row
+        return ItemProposta._hidratar(
+            item_id, descricao, int(quantidade), float(valor_unitario)
+        )
 
     @classmethod
     def carregar_tudo(cls, gestor: GestorPropostas):
-        gestor.clientes.clear()
-        gestor.propostas.clear()
+        gestor.repositorio = None
+        gestor.limpar()
+        gestor.buscador = cls.buscar_ids if cls._busca_textual else None
 
         conn = cls._get_conn()
-        cur = conn.cursor()
+        # uma transação de leitura: as três consultas veem o mesmo snapshot
+        conn.execute("BEGIN")
+        try:
+            gestor.ultima_alteracao = cls._ultima_alteracao(conn)
+            cls._hidratar_tudo(conn, gestor)
+        finally:
+            conn.rollback()
 
+    @classmethod
+    def _hidratar_tudo(cls, conn: sqlite3.Connection, gestor: GestorPropostas):
         # ---- Clientes
-        cur.execute("SELECT id, nome, documento, contato FROM clientes ORDER BY id")
-        rows_clientes = cur.fetchall()
+        cur = conn.execute("SELECT id, nome, documento, contato FROM clientes ORDER BY id")
 
         mapa_clientes: Dict[int, Cliente] = {}
-        max_cliente_id = 0
 
-        for row in rows_clientes:
-            cli_id, nome, documento, contato = row
-            cliente = Cliente(nome, documento or "", contato or "")
-            cliente.id = cli_id
-            mapa_clientes[cli_id] = cliente
-            gestor.clientes.append(cliente)
-            max_cliente_id = max(max_cliente_id, cli_id)
+        for row in cls._linhas(cur):
+            cliente = cls._cliente_de_linha(row)
+            mapa_clientes[cliente.id] = cliente
+            gestor.adicionar_cliente(cliente)
+
+        # ---- Propostas
+        cur = conn.execute(
+            f"""
+            SELECT {cls._COLUNAS_PROPOSTA}
+            FROM propostas p
+            ORDER BY p.id
+            """
+        )
 
-        if max_cliente_id > 0:
-            Cliente._contador_id = max_cliente_id + 1
+        mapa_propostas: Dict[int, Proposta] = {}
 
-        cur.execute(
+        for row in cls._linhas(cur):
+            cliente = mapa_clientes.get(row[1])
+            if not cliente:
+                continue
+
+            prop = cls._proposta_de_linha(row, cliente)
+            gestor.adicionar_proposta(prop)
+            mapa_propostas[prop.id] = prop
+
+        # ---- Itens
+        cur = conn.execute(
             """
-            SELECT
-                id, cliente_id, titulo, data_criacao, status,
-                validade, responsavel, condicoes_pagamento,
-                tipo_desconto, desconto_percentual, desconto_valor
-            FROM propostas
+            SELECT id, proposta_id, descricao, quantidade, valor_unitario
+            FROM itens
             ORDER BY id
             """
         )
-        rows_propostas = cur.fetchall()
 
-        mapa_propostas: Dict[int, Proposta] = {}
-        max_proposta_id = 0
-
-        for row in rows_propostas:
-            (
-                p_id,
-                cliente_id,
-                titulo,
-                data_criacao_str,
-                status,
-                validade_str,
-                responsavel,
-                condicoes_pagamento,
-                tipo_desconto,
-                desconto_percentual,
-                desconto_valor,
-            ) = row
-
-            cliente = mapa_clientes.get(cliente_id)
-            if not cliente:
+        for row in cls._linhas(cur):
+            prop = mapa_propostas.get(row[1])
+            if not prop:
                 continue
+            prop.adicionar_item(cls._item_de_linha(row))
 
-            prop = Proposta(
-                cliente=cliente,
-                titulo=titulo,
-                validade=None,
-                responsavel=responsavel or "",
-                condicoes_pagamento=condicoes_pagamento or "",
-            )
+    # =========================================================
+    #   SINCRONIZAÇÃO ENTRE PROCESSOS
+    # =========================================================
+    @classmethod
+    def sincronizar(cls, gestor: GestorPropostas) -> bool:
+        """Aplica no gestor o que outros processos gravaram desde a última vez.
 
-            prop.id = p_id
+        Devolve True se o gestor mudou.
+        """
+        conn = cls._get_conn()
+        # data_version só muda quando outra conexão faz commit: na maioria
+        # das requisições a verificação para aqui, sem ler nenhuma tabela
+        versao = conn.execute("PRAGMA data_version").fetchone()[0]
+        vistas = cls._versoes_vistas.__dict__.setdefault("vistas", {})
+        chave = (id(conn), id(gestor))
+        if vistas.get(chave) == versao:
+            return False
+
+        if cls._fila is not None:
+            # as escritas na fila foram feitas sobre o gestor atual: se a
+            # releitura viesse antes, a fila gravaria o objeto relido por
+            # cima do que o outro processo gravou, e este processo pula o
+            # que ele mesmo grava no log (o gestor ficaria diferente do banco)
+            try:
+                cls._fila.descarregar()
+            except Exception as erro:
+                if banco_ocupado(erro):
+                    # a fila continua com tudo; tenta na próxima vez
+                    return False
+                # só a operação com erro foi descartada (e o erro registrado)
+
+        with cls._sincronizando:
+            conn.execute("BEGIN")
             try:
-                prop.data_criacao = datetime.strptime(
-                    data_criacao_str, "%Y-%m-%d %H:%M:%S"
+                mudou = cls._aplicar_alteracoes(conn, gestor)
+            finally:
+                conn.rollback()
+            if mudou is None:
+                # o log já foi podado além do ponto em que o gestor parou
+                with gestor.escrita():
+                    if gestor.sob_demanda:
+                        cls.configurar_sob_demanda(gestor)
+                    else:
+                        cls.carregar_tudo(gestor)
+                mudou = True
+
+        vistas[chave] = versao
+        return mudou
+
+    @classmethod
+    def versao_dados(cls, gestor: GestorPropostas) -> int:
+        """Número da última alteração gravada, com o gestor já atualizado até ela.
+
+        Serve de chave para caches de relatórios: o gestor pode estar à
+        frente dessa versão, mas nunca atrás. Não chamar segurando o lock
+        do gestor (a sincronização pode precisar da escrita).
+        """
+        if cls._fila is not None:
+            # o que está na fila ainda não entrou no log
+            cls._fila.descarregar()
+        versao = cls._ultima_alteracao(cls._get_conn())
+        cls.sincronizar(gestor)
+        return versao
+
+    @classmethod
+    def _aplicar_alteracoes(cls, conn: sqlite3.Connection, gestor: GestorPropostas) -> Optional[bool]:
+        inicio = gestor.ultima_alteracao
+        primeira = conn.execute("SELECT MIN(seq) FROM alteracoes").fetchone()[0]
+        if primeira is not None and primeira > inicio + 1:
+            return None
+
+        clientes: Set[int] = set()
+        propostas: Set[int] = set()
+        ultima = inicio
+        cur = conn.execute(
+            "SELECT seq, entidade, entidade_id, origem FROM alteracoes WHERE seq > ? ORDER BY seq",
+            (inicio,),
+        )
+        for seq, entidade, entidade_id, origem in cur:
+            ultima = seq
+            # o que este processo gravou já está no gestor
+            if origem == cls.ORIGEM:
+                continue
+            if entidade == "cliente":
+                clientes.add(entidade_id)
+            else:
+                propostas.add(entidade_id)
+
+        if not clientes and not propostas:
+            # só commits deste processo (de outras threads): nada a aplicar
+            gestor.ultima_alteracao = ultima
+            return False
+
+        with gestor.escrita():
+            if gestor.sob_demanda:
+                # basta esquecer os objetos em cache: serão relidos no próximo acesso
+                for cliente_id in clientes:
+                    gestor.remover_cliente(cliente_id)
+                for proposta_id in propostas:
+                    gestor.remover_proposta(proposta_id)
+            else:
+                for lote in _em_lotes(clientes):
+                    cls._reler_clientes(conn, gestor, lote)
+                for lote in _em_lotes(propostas):
+                    cls._reler_propostas(conn, gestor, lote)
+            gestor.ultima_alteracao = ultima
+        return True
+
+    @classmethod
+    def _reler_clientes(cls, conn: sqlite3.Connection, gestor: GestorPropostas, ids: List[int]):
+        marcadores = ", ".join("?" * len(ids))
+        cur = conn.execute(
+            f"SELECT id, nome, documento, contato FROM clientes WHERE id IN ({marcadores})",
+            ids,
+        )
+        encontrados = set()
+        for row in cur:
+            encontrados.add(row[0])
+            cliente = gestor.obter_cliente(row[0])
+            if cliente is None:
+                gestor.adicionar_cliente(cls._cliente_de_linha(row))
+            else:
+                # atualiza no lugar: as propostas apontam para este objeto
+                cliente.nome, cliente.documento, cliente.contato = row[1], row[2] or "", row[3] or ""
+        for cliente_id in set(ids) - encontrados:
+            gestor.remover_cliente(cliente_id)
+
+    @classmethod
+    def _reler_propostas(cls, conn: sqlite3.Connection, gestor: GestorPropostas, ids: List[int]):
+        marcadores = ", ".join("?" * len(ids))
+        linhas = conn.execute(
+            f"SELECT {cls._COLUNAS_PROPOSTA} FROM propostas p WHERE p.id IN ({marcadores})",
+            ids,
+        ).fetchall()
+
+        # a proposta inteira é trocada: status, totais e buckets se ajustam
+        # pelos caminhos normais de remover/adicionar
+        for proposta_id in ids:
+            gestor.remover_proposta(proposta_id)
+
+        relidas: Dict[int, Proposta] = {}
+        for row in linhas:
+            cliente = gestor.obter_cliente(row[1])
+            if cliente is None:
+                continue
+            proposta = cls._proposta_de_linha(row, cliente)
+            gestor.adicionar_proposta(proposta)
+            relidas[proposta.id] = proposta
+
+        cur = conn.execute(
+            f"""
+            SELECT id, proposta_id, descricao, quantidade, valor_unitario
+              FROM itens
+             WHERE proposta_id IN ({marcadores})
+             ORDER BY id
+            """,
+            ids,
+        )
+        for row in cur:
+            proposta = relidas.get(row[1])
+            if proposta is not None:
+                proposta.adicionar_item(cls._item_de_linha(row))
+
+    # =========================================================
+    #   MODO SOB DEMANDA
+    # =========================================================
+    @classmethod
+    def configurar_sob_demanda(cls, gestor: GestorPropostas):
+        """Liga o gestor ao banco sem carregar nada."""
+        gestor.limpar()
+        gestor.repositorio = cls
+        gestor.ultima_alteracao = cls._ultima_alteracao(cls._get_conn())
+
+    @classmethod
+    def _cliente_em_cache(cls, gestor: GestorPropostas, row) -> Cliente:
+        cliente = gestor._cache_clientes.get(row[0])
+        if cliente is None:
+            cliente = cls._cliente_de_linha(row)
+            gestor._cache_clientes[cliente.id] = cliente
+        return cliente
+
+    @classmethod
+    def _proposta_em_cache(cls, gestor: GestorPropostas, row) -> Proposta:
+        # row = colunas da proposta seguidas das colunas do cliente
+        proposta = gestor._cache_propostas.get(row[0])
+        if proposta is None:
+            n = cls._N_COLUNAS_PROPOSTA
+            cliente = cls._cliente_em_cache(gestor, row[n:])
+            proposta = cls._proposta_de_linha(row[:n], cliente)
+            proposta.itens = None
+            proposta._carregador_itens = cls.carregar_itens
+            gestor._cache_propostas[proposta.id] = proposta
+        return proposta
+
+    @classmethod
+    def buscar_cliente(cls, gestor: GestorPropostas, cliente_id: int) -> Optional[Cliente]:
+        row = cls._get_conn().execute(
+            "SELECT id, nome, documento, contato FROM clientes WHERE id = ?",
+            (cliente_id,),
+        ).fetchone()
+        return cls._cliente_em_cache(gestor, row) if row else None
+
+    @classmethod
+    def buscar_clientes(cls, gestor: GestorPropostas) -> List[Cliente]:
+        cur = cls._get_conn().execute(
+            "SELECT id, nome, documento, contato FROM clientes ORDER BY id"
+        )
+        return [cls._cliente_em_cache(gestor, row) for row in cur]
+
+    @classmethod
+    def buscar_proposta(cls, gestor: GestorPropostas, proposta_id: int) -> Optional[Proposta]:
+        row = cls._get_conn().execute(
+            f"""
+            SELECT {cls._COLUNAS_PROPOSTA}, c.id, c.nome, c.documento, c.contato
+              FROM propostas p
+              JOIN clientes c ON c.id = p.cliente_id
+             WHERE p.id = ?
+            """,
+            (proposta_id,),
+        ).fetchone()
+        return cls._proposta_em_cache(gestor, row) if row else None
+
+    @staticmethod
+    def _consulta_fts(q: str) -> str:
+        # cada palavra vira um prefixo entre aspas: "picanh"* "sao"*
+        termos = re.findall(r"\w+", q)
+        return " ".join('"' + t.replace('"', '""') + '"*' for t in termos)
+
+    @classmethod
+    def _filtro_texto(cls, q: str) -> Tuple[str, str, List[Any], str]:
+        """Devolve (join, condição, parâmetros, ordenação) para o filtro q.
+
+        Os parâmetros seguem a ordem do SQL: os do join, depois os da condição.
+        """
+        padrao = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        substring = "LOWER(p.titulo) LIKE ? ESCAPE '\\' OR LOWER(c.nome) LIKE ? ESCAPE '\\'"
+        if cls._busca_textual:
+            consulta = cls._consulta_fts(q)
+            if consulta:
+                # como no modo completo: os achados do FTS, por relevância,
+                # e depois os que só casam como substring ("anha" em "Picanha")
+                return (
+                    """
+                    LEFT JOIN (
+                        SELECT rowid, rank FROM propostas_busca WHERE propostas_busca MATCH ?
+                    ) f ON f.rowid = p.id
+                    """,
+                    f"(f.rowid IS NOT NULL OR {substring})",
+                    [consulta, padrao, padrao],
+                    "f.rank IS NULL, f.rank, p.id",
                 )
-            except Exception:
-                prop.data_criacao = datetime.now()
+        return ("", f"({substring})", [padrao, padrao], "p.id")
+
+    @classmethod
+    def buscar_ids(cls, q: str) -> Optional[List[int]]:
+        """Ids das propostas que casam com q, da mais para a menos relevante.
+
+        Cada palavra de q é tratada como prefixo, sem diferenciar
+        maiúsculas nem acentos (título, cliente, responsável e itens).
+        Devolve None se q não tiver nenhuma palavra pesquisável.
+        """
+        consulta = cls._consulta_fts(q)
+        if not consulta:
+            return None
+        if cls._fila is not None:
+            # o índice FTS só enxerga o que já foi gravado
+            cls._fila.descarregar()
+        cur = cls._get_conn().execute(
+            "SELECT rowid FROM propostas_busca WHERE propostas_busca MATCH ? ORDER BY rank",
+            (consulta,),
+        )
+        return [row[0] for row in cur]
+
+    @classmethod
+    def buscar_propostas(
+        cls,
+        gestor: GestorPropostas,
+        status: str = "",
+        q: str = "",
+        limite: Optional[int] = None,
+    ) -> List[Proposta]:
+        join = ""
+        ordem = "p.id"
+        condicoes = []
+        params: List[Any] = []
+        if q:
+            join, condicao, params_q, ordem = cls._filtro_texto(q)
+            condicoes.append(condicao)
+            params.extend(params_q)
+        if status:
+            condicoes.append("p.status = ?")
+            params.append(status)
+
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        sql = f"""
+            SELECT {cls._COLUNAS_PROPOSTA}, c.id, c.nome, c.documento, c.contato
+              FROM propostas p
+              JOIN clientes c ON c.id = p.cliente_id
+              {join}
+              {where}
+             ORDER BY {ordem}
+        """
+        if limite is not None:
+            sql += " LIMIT ?"
+            params.append(limite)
+
+        cur = cls._get_conn().execute(sql, params)
+        return [cls._proposta_em_cache(gestor, row) for row in cur]
 
-            prop.status = status
-            if validade_str:
-                try:
-                    prop.validade = datetime.strptime(
-                        validade_str, "%Y-%m-%d"
-                    ).date()
-                except Exception:
-                    prop.validade = None
+    @classmethod
+    def paginar_propostas(
+        cls,
+        gestor: GestorPropostas,
+        status: str = "",
+        q: str = "",
+        limite: int = 20,
+        cursor: Optional[Tuple[datetime, int]] = None,
+    ) -> Tuple[List[Proposta], Optional[Tuple[datetime, int]]]:
+        """Mesma paginação de GestorPropostas.paginar_propostas, feita no banco."""
+        join = ""
+        condicoes = []
+        params: List[Any] = []
+        if q:
+            join, condicao, params_q, _ = cls._filtro_texto(q)
+            condicoes.append(condicao)
+            params.extend(params_q)
+        if status:
+            condicoes.append("p.status = ?")
+            params.append(status)
+        if cursor is not None:
+            # data_criacao é gravada como texto ISO, que ordena como a data
+            condicoes.append("(p.data_criacao, p.id) < (?, ?)")
+            params.extend((cursor[0].strftime("%Y-%m-%d %H:%M:%S"), cursor[1]))
+
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        sql = f"""
+            SELECT {cls._COLUNAS_PROPOSTA}, c.id, c.nome, c.documento, c.contato
+              FROM propostas p
+              JOIN clientes c ON c.id = p.cliente_id
+              {join}
+              {where}
+             ORDER BY p.data_criacao DESC, p.id DESC
+             LIMIT ?
+        """
+        # um a mais só para saber se existe próxima página
+        params.append(limite + 1)
+
+        cur = cls._get_conn().execute(sql, params)
+        pagina = [cls._proposta_em_cache(gestor, row) for row in cur]
+        if len(pagina) > limite:
+            ultima = pagina[limite - 1]
+            return pagina[:limite], (ultima.data_criacao, ultima.id)
+        return pagina, None
 
-            prop.tipo_desconto = tipo_desconto
-            prop.desconto_percentual = desconto_percentual or 0.0
-            prop.desconto_valor = desconto_valor or 0.0
+    @classmethod
+    def carregar_itens(cls, proposta: Proposta) -> List[ItemProposta]:
+        cur = cls._get_conn().execute(
+            """
+            SELECT id, proposta_id, descricao, quantidade, valor_unitario
+              FROM itens
+             WHERE proposta_id = ?
+             ORDER BY id
+            """,
+            (proposta.id,),
+        )
+        return [cls._item_de_linha(row) for row in cur]
 
-            gestor.propostas.append(prop)
-            mapa_propostas[p_id] = prop
-            max_proposta_id = max(max_proposta_id, p_id)
+    @classmethod
+    def contar_clientes(cls) -> int:
+        return cls._get_conn().execute("SELECT COUNT(*) FROM clientes").fetchone()[0]
 
-        if max_proposta_id > 0:
-            Proposta._contador_id = max_proposta_id + 1
+    @classmethod
+    def contar_propostas(cls, status: str = "") -> int:
+        sql = "SELECT COUNT(*) FROM propostas p JOIN clientes c ON c.id = p.cliente_id"
+        params: Tuple[Any, ...] = ()
+        if status:
+            sql += " WHERE p.status = ?"
+            params = (status,)
+        return cls._get_conn().execute(sql, params).fetchone()[0]
 
-        cur.execute(
+    @classmethod
+    def listar_status(cls) -> List[str]:
+        cur = cls._get_conn().execute(
+            "SELECT DISTINCT status FROM propostas ORDER BY status"
+        )
+        return [row[0] for row in cur]
+
+    @classmethod
+    def somar_totais(cls, status: str = "") -> float:
+        # usa o total persistido: não precisa ler os itens
+        sql = """
+            SELECT COALESCE(SUM(p.total), 0.0)
+              FROM propostas p
+              JOIN clientes c ON c.id = p.cliente_id
+        """
+        params: Tuple[Any, ...] = ()
+        if status:
+            sql += " WHERE p.status = ?"
+            params = (status,)
+        return float(cls._get_conn().execute(sql, params).fetchone()[0])
+
+    @classmethod
+    def totais_por_status(cls) -> Dict[str, Tuple[int, float]]:
+        cur = cls._get_conn().execute(
             """
-            SELECT proposta_id, descricao, quantidade, valor_unitario
-            FROM itens
-            ORDER BY id
+            SELECT p.status, COUNT(*), COALESCE(SUM(p.total), 0.0)
+              FROM propostas p
+              JOIN clientes c ON c.id = p.cliente_id
+             GROUP BY p.status
+             ORDER BY p.status
             """
         )
-        rows_itens = cur.fetchall()
+        return {status: (qtd, float(soma)) for status, qtd, soma in cur}
 
-        for row in rows_itens:
-            proposta_id, descricao, quantidade, valor_unitario = row
-            prop = mapa_propostas.get(proposta_id)
-            if not prop:
-                continue
-            item = ItemProposta(
-                descricao=descricao,
-                quantidade=int(quantidade),
-                valor_unitario=float(valor_unitario),
-            )
-            prop.itens.append(item)
 
-        conn.close()
+def _em_lotes(ids: Iterable[int], tamanho: int = 500) -> Iterator[List[int]]:
+    # mantém o IN (...) abaixo do limite de parâmetros do SQLite
+    ids = sorted(ids)
+    for i in range(0, len(ids), tamanho):
+        yield ids[i : i + tamanho]
+
+
+def _nova_origem():
+    # pid + sufixo aleatório; refeita no filho após um fork (ex.: gunicorn
+    # com --preload), senão todos os workers teriam a mesma origem
+    StorageManager.ORIGEM = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+_nova_origem()
+os.register_at_fork(after_in_child=_nova_origem)
+
+
+class UnitOfWork:
+    """Acumula alterações e grava todas numa única transação.
+
+    Uso típico numa rota::
+
+        with StorageManager.sessao() as sessao:
+            sessao.salvar_proposta(proposta)
+            sessao.sincronizar_itens(proposta)
+
+    Ao sair do bloco sem erro, ``flush()`` é chamado; se houver exceção,
+    nada é gravado. Com a gravação adiada ligada, o flush entrega as
+    operações à fila (ver StorageManager.sessao).
+    """
+
+    def __init__(self, storage, duravel: bool = False):
+        self._storage = storage
+        self.duravel = duravel
+        # chave (tipo, id da entidade) -> operação, na ordem em que foram pedidas
+        self._operacoes: Dict[Tuple[str, int], Tuple[Callable, Tuple[Any, ...]]] = {}
+
+    def _agendar(self, chave: Tuple[str, int], operacao: Callable, *args):
+        # salvar o mesmo objeto duas vezes na sessão gera uma única escrita
+        if chave not in self._operacoes:
+            self._operacoes[chave] = (operacao, args)
+
+    def salvar_cliente(self, cliente: Cliente):
+        self._agendar(("cliente", cliente.id), self._storage._upsert_cliente, cliente)
+
+    def deletar_cliente(self, cliente_id: int):
+        self._agendar(("-cliente", cliente_id), self._storage._delete_cliente, cliente_id)
+
+    def salvar_proposta(self, proposta: Proposta):
+        self._agendar(("proposta", proposta.id), self._storage._upsert_proposta, proposta)
+
+    def sincronizar_itens(self, proposta: Proposta):
+        self._agendar(("itens", proposta.id), self._storage._sync_itens, proposta)
+
+    def deletar_proposta(self, proposta_id: int):
+        self._agendar(("-proposta", proposta_id), self._storage._delete_proposta, proposta_id)
+
+    def flush(self):
+        operacoes, self._operacoes = self._operacoes, {}
+        fila = self._storage._fila
+        if fila is not None:
+            if operacoes:
+                fila.agendar((chave, op, args) for chave, (op, args) in operacoes.items())
+            if self.duravel:
+                fila.descarregar()
+        elif operacoes:
+            self._storage._gravar(operacoes.values())
+
+    def descartar(self):
+        self._operacoes = {}
+
+    def __enter__(self) -> "UnitOfWork":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.descartar()
+        return False
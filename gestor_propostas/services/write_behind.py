@@ -0,0 +1,182 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (tipo, id da entidade): ("proposta", 7), ("itens", 7), ("-proposta", 7)...
+Chave = Tuple[str, int]
+Operacao = Tuple[Callable, Tuple[Any, ...]]
+
+
+def banco_ocupado(erro: BaseException) -> bool:
+    """True se o erro é de banco ocupado/travado por outra conexão, o único
+    que passa sozinho; "no such table", esquema divergente etc. não passam."""
+    if not isinstance(erro, sqlite3.OperationalError):
+        return False
+    codigo = getattr(erro, "sqlite_errorcode", None)
+    if codigo is not None:
+        # o código estendido (ex.: SQLITE_BUSY_SNAPSHOT) guarda o primário no byte baixo
+        return codigo & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    mensagem = str(erro).lower()
+    return "locked" in mensagem or "busy" in mensagem
+
+
+class WriteBehindQueue:
+    """Fila de gravação adiada do StorageManager.
+
+    As rotas só enfileiram as operações; uma thread de fundo grava tudo o
+    que acumulou numa única transação, no máximo ``intervalo`` segundos
+    depois (ou antes, se a fila passar de ``lote_maximo``). Escritas
+    repetidas da mesma entidade viram uma só: cada operação lê o estado
+    do objeto na hora de gravar, então basta a última.
+    """
+
+    def __init__(
+        self,
+        gravar: Callable[[Iterable[Operacao]], None],
+        intervalo: float = 0.5,
+        lote_maximo: int = 500,
+        bloqueio: Optional[Callable[[], ContextManager]] = None,
+    ):
+        self._gravar = gravar
+        self.intervalo = intervalo
+        self.lote_maximo = lote_maximo
+        # as operações leem os objetos do gestor: gravam segurando este
+        # bloqueio (a leitura do gestor) para não ver um objeto pela metade
+        self._bloqueio = bloqueio or nullcontext
+        self._iniciar()
+        _filas.add(self)
+
+    def _iniciar(self):
+        self._pendentes: Dict[Chave, Operacao] = {}
+        self._cond = threading.Condition()
+        # um lote por vez, sempre adquirido depois do bloqueio do gestor
+        self._gravando = threading.Lock()
+        self._parando = False
+        self._thread = threading.Thread(
+            target=self._executar, name="gravacao-adiada", daemon=True
+        )
+        self._thread.start()
+
+    def agendar(self, operacoes: Iterable[Tuple[Chave, Callable, Tuple[Any, ...]]]):
+        with self._cond:
+            if self._parando:
+                raise RuntimeError("A fila de gravação adiada já foi encerrada.")
+            pendentes = self._pendentes
+            estava_vazia = not pendentes
+            for (tipo, entidade_id), operacao, args in operacoes:
+                if tipo.startswith("-"):
+                    # exclusão: o que estava pendente para a entidade não importa mais
+                    pendentes.pop((tipo[1:], entidade_id), None)
+                    if tipo == "-proposta":
+                        pendentes.pop(("itens", entidade_id), None)
+                # chave repetida mantém a posição original na fila
+                pendentes[(tipo, entidade_id)] = (operacao, args)
+            # acorda a thread para contar o intervalo, ou para gravar já
+            if (estava_vazia and pendentes) or len(pendentes) >= self.lote_maximo:
+                self._cond.notify()
+
+    def descarregar(self):
+        """Grava agora, na thread atual, tudo o que está pendente.
+
+        Se o banco estiver ocupado, o que não foi gravado volta para a fila
+        e o erro é repassado. Uma operação com qualquer outro erro (ex.:
+        chave estrangeira, tabela inexistente) é descartada sozinha: as
+        demais do lote são gravadas e o erro dela é repassado depois.
+        """
+        with self._bloqueio():
+            with self._gravando:
+                with self._cond:
+                    lote, self._pendentes = self._pendentes, {}
+                if not lote:
+                    return
+                try:
+                    self._gravar(lote.values())
+                except Exception as erro:
+                    if banco_ocupado(erro):
+                        # o lote inteiro volta para a fila
+                        self._repor(lote)
+                        raise
+                    if len(lote) == 1:
+                        self._descartar(lote)
+                        raise
+                    # grava uma operação por vez para isolar a que falhou
+                    self._gravar_uma_a_uma(lote)
+
+    def _gravar_uma_a_uma(self, lote: Dict[Chave, Operacao]):
+        primeiro_erro: Optional[Exception] = None
+        chaves = list(lote)
+        for i, chave in enumerate(chaves):
+            try:
+                self._gravar([lote[chave]])
+            except Exception as erro:
+                if banco_ocupado(erro):
+                    self._repor({c: lote[c] for c in chaves[i:]})
+                    raise
+                self._descartar({chave: lote[chave]})
+                if primeiro_erro is None:
+                    primeiro_erro = erro
+        if primeiro_erro is not None:
+            raise primeiro_erro
+
+    def _repor(self, lote: Dict[Chave, Operacao]):
+        # volta para a frente da fila; o que foi agendado depois prevalece
+        with self._cond:
+            lote = dict(lote)
+            lote.update(self._pendentes)
+            self._pendentes = lote
+
+    @staticmethod
+    def _descartar(lote: Dict[Chave, Operacao]):
+        for chave in lote:
+            logger.error("Operação %s descartada da fila de gravação adiada", chave)
+
+    def _executar(self):
+        while True:
+            with self._cond:
+                while not self._pendentes and not self._parando:
+                    self._cond.wait()
+                if self._parando:
+                    return
+                # espera o intervalo acumulando escritas, salvo se a fila encher
+                limite = time.monotonic() + self.intervalo
+                while len(self._pendentes) < self.lote_maximo and not self._parando:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._cond.wait(restante)
+
+            try:
+                self.descarregar()
+            except Exception:
+                logger.exception("Falha ao gravar o lote da fila de gravação adiada")
+
+    def parar(self):
+        """Encerra a thread de fundo gravando o que ainda estiver na fila."""
+        with self._cond:
+            if self._parando:
+                return
+            self._parando = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.descarregar()
+
+
+_filas: "weakref.WeakSet[WriteBehindQueue]" = weakref.WeakSet()
+
+
+def _reiniciar_apos_fork():
+    # a thread de fundo não sobrevive ao fork (ex.: gunicorn com --preload);
+    # o pendente herdado é gravado pelo processo pai
+    for fila in list(_filas):
+        if not fila._parando:
+            fila._iniciar()
+
+
+os.register_at_fork(after_in_child=_reiniciar_apos_fork)
@@ -1,5 +1,8 @@
-from datetime import datetime
+import os
+from datetime import date, datetime
 from functools import wraps
+from io import BytesIO
+from typing import BinaryIO
 
 from flask import (
     Blueprint,
@@ -10,14 +13,17 @@ from flask import (
     flash,
     session,
     send_file,
+    Response,
+    jsonify,
 )
 
 from .models import ItemProposta
 from .services.storage import StorageManager
 from .services.excel_report import ExcelReportGenerator
 from .services.pdf_report import PdfReportGenerator
+from .services.exportacoes import selecionar_propostas
 from .auth import AuthManager
-from . import gestor  # instância global criada em __init__.py
+from . import gestor, exportacoes, cache_excel, cache_pdf  # instâncias globais criadas em __init__.py
 
 
 bp = Blueprint("ui", __name__)
@@ -35,6 +41,71 @@ def login_required(view_func):
     return wrapper
 
 
+def usa_gestor(view_func):
+    """Segura o lock do gestor durante a view (e a renderização do template).
+
+    GET só lê e roda em paralelo com outras leituras; os demais métodos
+    alteram o gestor e têm acesso exclusivo.
+    """
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        if request.method in ("GET", "HEAD"):
+            bloqueio = gestor.leitura()
+        else:
+            bloqueio = gestor.escrita()
+        with bloqueio:
+            return view_func(*args, **kwargs)
+
+    return wrapper
+
+
+# cursor da paginação na URL: "<data_criacao>-<id>", ex.: 20240131154500-42
+FORMATO_CURSOR = "%Y%m%d%H%M%S"
+LIMITE_PADRAO = 5
+LIMITE_MAXIMO = 100
+
+
+def codificar_cursor(chave):
+    if chave is None:
+        return None
+    data_criacao, pid = chave
+    return f"{data_criacao.strftime(FORMATO_CURSOR)}-{pid}"
+
+
+def decodificar_cursor(texto: str):
+    """Chave (data_criacao, id) do cursor, ou None se estiver vazio/inválido."""
+    try:
+        data, pid = texto.split("-", 1)
+        return datetime.strptime(data, FORMATO_CURSOR), int(pid)
+    except ValueError:
+        return None
+
+
+def ler_limite(texto: str) -> int:
+    try:
+        limite = int(texto)
+    except ValueError:
+        return LIMITE_PADRAO
+    return min(max(limite, 1), LIMITE_MAXIMO)
+
+
+def ler_data(texto: str):
+    """Data de um <input type="date"> (AAAA-MM-DD), ou None se vazia/inválida."""
+    try:
+        return date.fromisoformat(texto.strip())
+    except ValueError:
+        return None
+
+
+def ler_filtro_exportacao(valores) -> dict:
+    return {
+        "q": valores.get("q", "").strip().lower(),
+        "status": valores.get("status", "").strip(),
+        "de": ler_data(valores.get("de", "")),
+        "ate": ler_data(valores.get("ate", "")),
+    }
+
+
 @bp.context_processor
 def inject_user():
     """Disponibiliza o usuário logado no template como 'usuario_logado'."""
@@ -107,34 +178,32 @@ def register():
 
 @bp.route("/")
 @login_required
+@usa_gestor
 def index():
     q = request.args.get("q", "").strip().lower()
     status = request.args.get("status", "").strip()
+    limite = ler_limite(request.args.get("limit", ""))
+    cursor = decodificar_cursor(request.args.get("cursor", ""))
 
-    todas_propostas = gestor.listar_propostas()
-    propostas = todas_propostas
-
-    if status:
-        propostas = [p for p in propostas if p.status == status]
-
-    if q:
-        propostas = [
-            p for p in propostas
-            if q in p.titulo.lower() or q in p.cliente.nome.lower()
-        ]
+    # só a página exibida é montada, da proposta mais recente para a mais antiga
+    propostas, proximo = gestor.paginar_propostas(
+        status=status, q=q, limite=limite, cursor=cursor
+    )
 
-    statuses = sorted({p.status for p in todas_propostas})
-    total_propostas = len(todas_propostas)
-    total_clientes = len(gestor.listar_clientes())
-    propostas_aceitas = [p for p in todas_propostas if p.status == "aceita"]
-    qtd_aceitas = len(propostas_aceitas)
-    valor_total_aceitas = sum(p.calcular_total() for p in propostas_aceitas)
+    statuses = gestor.listar_status()
+    total_propostas = gestor.contar_propostas()
+    total_clientes = gestor.contar_clientes()
+    qtd_aceitas = gestor.contar_propostas("aceita")
+    valor_total_aceitas = gestor.valor_total("aceita")
 
     return render_template(
         "index.html",
         propostas=propostas,
         filtro_q=q,
         filtro_status=status,
+        limite=limite,
+        pagina_inicial=cursor is None,
+        proximo_cursor=codificar_cursor(proximo),
         statuses=statuses,
         total_propostas=total_propostas,
         total_clientes=total_clientes,
@@ -147,8 +216,9 @@ def index():
 
 @bp.route("/propostas/<int:pid>")
 @login_required
+@usa_gestor
 def proposta_detalhe(pid: int):
-    proposta = next((p for p in gestor.propostas if p.id == pid), None)
+    proposta = gestor.obter_proposta(pid)
     if not proposta:
         flash("Proposta não encontrada.", "error")
         return redirect(url_for("ui.index"))
@@ -158,6 +228,7 @@ def proposta_detalhe(pid: int):
 
 @bp.route("/propostas/nova", methods=["GET", "POST"])
 @login_required
+@usa_gestor
 def nova_proposta():
     clientes = gestor.listar_clientes()
 
@@ -175,7 +246,7 @@ def nova_proposta():
         num_parcelas = request.form.get("num_parcelas", "").strip()
         pagamento_obs = request.form.get("pagamento_obs", "").strip()
 
-        cliente = next((c for c in clientes if c.id == cliente_id), None)
+        cliente = gestor.obter_cliente(cliente_id)
         if not cliente:
             flash("Cliente inválido.", "error")
             return redirect(url_for("ui.nova_proposta"))
@@ -205,8 +276,9 @@ def nova_proposta():
             condicoes_pagamento=cond_pag,
         )
 
-        StorageManager.salvar_ou_atualizar_proposta(prop)
-        StorageManager.sincronizar_itens_proposta(prop)
+        with StorageManager.sessao() as sessao:
+            sessao.salvar_proposta(prop)
+            sessao.sincronizar_itens(prop)
 
         flash(f"Proposta #{prop.id} criada com sucesso!", "success")
         return redirect(url_for("ui.proposta_detalhe", pid=prop.id))
@@ -216,8 +288,9 @@ def nova_proposta():
 
 @bp.route("/propostas/<int:pid>/add_item", methods=["POST"])
 @login_required
+@usa_gestor
 def add_item(pid: int):
-    proposta = next((p for p in gestor.propostas if p.id == pid), None)
+    proposta = gestor.obter_proposta(pid)
     if not proposta:
         flash("Proposta não encontrada.", "error")
         return redirect(url_for("ui.index"))
@@ -240,8 +313,9 @@ def add_item(pid: int):
     item = ItemProposta(desc, qtd, valor)
     proposta.adicionar_item(item)
 
-    StorageManager.sincronizar_itens_proposta(proposta)
-    StorageManager.salvar_ou_atualizar_proposta(proposta)
+    with StorageManager.sessao() as sessao:
+        sessao.salvar_proposta(proposta)
+        sessao.sincronizar_itens(proposta)
 
     flash("Item adicionado com sucesso!", "success")
     return redirect(url_for("ui.proposta_detalhe", pid=pid))
@@ -249,8 +323,9 @@ def add_item(pid: int):
 
 @bp.route("/propostas/<int:pid>/desconto", methods=["POST"])
 @login_required
+@usa_gestor
 def aplicar_desconto(pid: int):
-    proposta = next((p for p in gestor.propostas if p.id == pid), None)
+    proposta = gestor.obter_proposta(pid)
     if not proposta:
         flash("Proposta não encontrada.", "error")
         return redirect(url_for("ui.index"))
@@ -286,8 +361,9 @@ def aplicar_desconto(pid: int):
 
 @bp.route("/propostas/<int:pid>/pagamento", methods=["POST"])
 @login_required
+@usa_gestor
 def atualizar_pagamento(pid: int):
-    proposta = next((p for p in gestor.propostas if p.id == pid), None)
+    proposta = gestor.obter_proposta(pid)
     if not proposta:
         flash("Proposta não encontrada.", "error")
         return redirect(url_for("ui.index"))
@@ -314,33 +390,37 @@ def atualizar_pagamento(pid: int):
 
 @bp.route("/propostas/<int:pid>/excluir", methods=["POST"])
 @login_required
+@usa_gestor
 def excluir_proposta(pid: int):
-    proposta = next((p for p in gestor.propostas if p.id == pid), None)
+    proposta = gestor.obter_proposta(pid)
     if not proposta:
         flash("Proposta não encontrada.", "error")
         return redirect(url_for("ui.index"))
 
-    gestor.propostas = [p for p in gestor.propostas if p.id != pid]
+    gestor.remover_proposta(pid)
+    cache_pdf.invalidar(pid)
 
     try:
         if hasattr(StorageManager, "excluir_proposta"):
             StorageManager.excluir_proposta(pid)
         else:
-            StorageManager.deletar_proposta(pid)
+            # exclusão não espera a fila: o erro precisa chegar ao usuário
+            StorageManager.deletar_proposta(pid, duravel=True)
     except Exception:
         flash(
             "Erro ao excluir no banco, mas proposta foi removida da lista atual.",
             "error",
         )
-
-    flash(f"Proposta #{pid} excluída com sucesso.", "success")
+    else:
+        flash(f"Proposta #{pid} excluída com sucesso.", "success")
     return redirect(url_for("ui.index"))
 
 
 @bp.route("/propostas/<int:pid>/enviar", methods=["POST"])
 @login_required
+@usa_gestor
 def enviar_proposta(pid: int):
-    proposta = next((p for p in gestor.propostas if p.id == pid), None)
+    proposta = gestor.obter_proposta(pid)
     if not proposta:
         flash("Proposta não encontrada.", "error")
         return redirect(url_for("ui.index"))
@@ -356,49 +436,173 @@ def enviar_proposta(pid: int):
     return redirect(url_for("ui.index"))
 
 
+def chave_excel(filtro: dict) -> str:
+    """Chave da planilha do filtro no cache, que também é o ETag do download.
+
+    Não chamar segurando o lock do gestor (ver StorageManager.versao_dados).
+    """
+    versao = StorageManager.versao_dados(gestor)
+    return cache_excel.chave(StorageManager.IDENTIDADE_BANCO, versao, **filtro)
+
+
+def resposta_excel(resposta: Response, chave: str) -> Response:
+    resposta.set_etag(chave)
+    # o navegador pode guardar, mas confirma a versão a cada download
+    resposta.cache_control.private = True
+    resposta.cache_control.no_cache = True
+    return resposta
+
+
+def nome_planilha() -> str:
+    return f"propostas_{datetime.now():%Y%m%d_%H%M}.xlsx"
+
+
+def enviar_planilha(arquivo: BinaryIO, chave: str) -> Response:
+    """Resposta com a planilha já aberta (ver ExcelCache.abrir)."""
+    # o send_file só tira tamanho e data de um caminho; de um arquivo
+    # aberto vêm do fstat, e os ranges são tratados aqui
+    info = os.fstat(arquivo.fileno())
+    resposta = send_file(
+        arquivo,
+        as_attachment=True,
+        download_name=nome_planilha(),
+        etag=False,
+        last_modified=info.st_mtime,
+        conditional=False,
+    )
+    resposta.content_length = info.st_size
+    try:
+        resposta = resposta.make_conditional(
+            request, accept_ranges=True, complete_length=info.st_size
+        )
+    except Exception:
+        arquivo.close()
+        raise
+    return resposta_excel(resposta, chave)
+
+
 @bp.route("/propostas/excel")
 @login_required
 def download_excel():
-    if not gestor.listar_propostas():
+    # sem JavaScript o formulário de exportação cai aqui; com ele, a
+    # exportação vai para criar_exportacao e roda em segundo plano
+    filtro = ler_filtro_exportacao(request.args)
+    chave = chave_excel(filtro)
+    if request.if_none_match.contains(chave):
+        return resposta_excel(Response(status=304), chave)
+
+    # aberta já aqui: a poda de outro worker pode apagar o arquivo a qualquer
+    # momento; se já tiver saído do cache, é gerada de novo abaixo
+    arquivo = cache_excel.abrir(chave)
+    if arquivo is not None:
+        return enviar_planilha(arquivo, chave)
+
+    with gestor.leitura():
+        propostas = selecionar_propostas(gestor, **filtro)
+    if not propostas:
         flash("Não há propostas para exportar.", "info")
         return redirect(url_for("ui.index"))
 
-    caminho = ExcelReportGenerator.gerar_excel(gestor)
-    return send_file(caminho, as_attachment=True)
+    # a planilha é gerada enquanto a resposta é enviada, e guardada no cache
+    # no caminho; a geração roda depois da view e pega o lock por conta própria
+    partes = ExcelReportGenerator.gerar_excel_em_partes(
+        gestor, propostas=propostas, bloqueio=gestor.leitura
+    )
+    resposta = Response(
+        cache_excel.guardar_em_partes(chave, partes),
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f'attachment; filename="{nome_planilha()}"'},
+    )
+    return resposta_excel(resposta, chave)
+
+
+def estado_exportacao(estado: dict) -> dict:
+    resposta = {
+        chave: estado[chave]
+        for chave in ("id", "estado", "processadas", "total", "criada_em", "erro")
+    }
+    resposta["status_url"] = url_for("ui.status_exportacao", job_id=estado["id"])
+    if estado["estado"] == "pronta":
+        resposta["download_url"] = url_for("ui.baixar_exportacao", job_id=estado["id"])
+    return resposta
+
+
+@bp.route("/propostas/exportacoes", methods=["POST"])
+@login_required
+def criar_exportacao():
+    # não segura o lock do gestor: a exportação o pega no pool
+    filtro = ler_filtro_exportacao(request.form)
+    estado = exportacoes.enviar(session["username"], chave_excel(filtro), **filtro)
+    return jsonify(estado_exportacao(estado)), 202
+
+
+@bp.route("/propostas/exportacoes/<job_id>")
+@login_required
+def status_exportacao(job_id: str):
+    estado = exportacoes.consultar(job_id, session["username"])
+    if estado is None:
+        return jsonify({"erro": "Exportação não encontrada."}), 404
+    return jsonify(estado_exportacao(estado))
+
+
+@bp.route("/propostas/exportacoes/<job_id>/arquivo")
+@login_required
+def baixar_exportacao(job_id: str):
+    estado = exportacoes.consultar(job_id, session["username"])
+    arquivo = exportacoes.arquivo(estado) if estado else None
+    if arquivo is None:
+        flash("A exportação não está disponível.", "error")
+        return redirect(url_for("ui.index"))
+    if request.if_none_match.contains(estado["chave"]):
+        arquivo.close()
+        return resposta_excel(Response(status=304), estado["chave"])
+
+    return enviar_planilha(arquivo, estado["chave"])
 
 
 @bp.route("/propostas/<int:pid>/pdf")
 @login_required
+@usa_gestor
 def download_pdf(pid: int):
-    proposta = next((p for p in gestor.propostas if p.id == pid), None)
+    proposta = gestor.obter_proposta(pid)
     if not proposta:
         flash("Proposta não encontrada.", "error")
         return redirect(url_for("ui.index"))
 
-    from tempfile import NamedTemporaryFile
-
-    tmp = NamedTemporaryFile(delete=False, suffix=f"_proposta_{proposta.id}.pdf")
-    tmp.close()
-
-    PdfReportGenerator.gerar_pdf_proposta(proposta, tmp.name)
-
+    # só renderiza de novo se algo que aparece no PDF mudou; a renderização
+    # é em memória e os bytes vão direto para a resposta
+    chave = cache_pdf.chave(PdfReportGenerator.conteudo(proposta))
+    dados = cache_pdf.obter(
+        proposta.id, chave, lambda: PdfReportGenerator.gerar_pdf_bytes(proposta)
+    )
     return send_file(
-        tmp.name,
+        BytesIO(dados),
+        mimetype="application/pdf",
         as_attachment=True,
         download_name=f"proposta_{proposta.id}.pdf",
+        etag=chave,
     )
 
 
+@bp.route("/cache/estatisticas")
+@login_required
+def estatisticas_cache():
+    """Acertos e faltas do cache de PDFs (memória e disco)."""
+    return jsonify(pdf=cache_pdf.estatisticas())
+
+
 # ========= clientes ========= #
 
 @bp.route("/clientes")
 @login_required
+@usa_gestor
 def clientes():
     return render_template("clientes.html", clientes=gestor.listar_clientes())
 
 
 @bp.route("/clientes/novo", methods=["GET", "POST"])
 @login_required
+@usa_gestor
 def novo_cliente():
     if request.method == "POST":
         nome = request.form.get("nome", "").strip()
@@ -36,4 +36,56 @@ document.addEventListener("DOMContentLoaded", () => {
             }
         });
     });
+
+    // Exportação em segundo plano: agenda a planilha, acompanha o progresso
+    // e baixa quando ficar pronta
+    document.querySelectorAll("form[data-exportacao-url]").forEach(form => {
+        const botao = form.querySelector('button[type="submit"]');
+        const aviso = form.querySelector(".df-exportacao-status");
+        const esperar = ms => new Promise(resolve => setTimeout(resolve, ms));
+        // desiste de acompanhar depois disso (o servidor pode ter caído)
+        const LIMITE_ESPERA_MS = 15 * 60 * 1000;
+
+        form.addEventListener("submit", async e => {
+            e.preventDefault();
+            botao.disabled = true;
+            aviso.textContent = "Na fila...";
+            try {
+                let resp = await fetch(form.dataset.exportacaoUrl, {
+                    method: "POST",
+                    body: new FormData(form),
+                });
+                if (!resp.ok) throw new Error(resp.statusText);
+                let job = await resp.json();
+                const limite = Date.now() + LIMITE_ESPERA_MS;
+
+                while (job.estado === "na_fila" || job.estado === "executando") {
+                    if (Date.now() > limite) {
+                        aviso.textContent = "A exportação demorou demais. Tente de novo.";
+                        return;
+                    }
+                    await esperar(1000);
+                    resp = await fetch(job.status_url);
+                    if (!resp.ok) throw new Error(resp.statusText);
+                    job = await resp.json();
+                    if (job.total) {
+                        const pct = Math.floor((100 * job.processadas) / job.total);
+                        aviso.textContent = `Gerando... ${pct}%`;
+                    }
+                }
+                if (job.estado === "vazia") {
+                    aviso.textContent = "Nenhuma proposta para exportar.";
+                    return;
+                }
+                if (job.estado !== "pronta") throw new Error(job.erro);
+
+                aviso.textContent = "Pronta.";
+                window.location.href = job.download_url;
+            } catch (err) {
+                aviso.textContent = "Falha ao exportar.";
+            } finally {
+                botao.disabled = false;
+            }
+        });
+    });
 });
@@ -0,0 +1,10 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# importar gestor_propostas abre, migra e carrega o banco de DEALFLOW_BANCO:
+# os testes usam um banco temporário, nunca o de verdade
+_PASTA = tempfile.mkdtemp(prefix="dealflow_testes_")
+atexit.register(shutil.rmtree, _PASTA, True)
+os.environ["DEALFLOW_BANCO"] = os.path.join(_PASTA, "testes.db")
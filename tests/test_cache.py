@@ -0,0 +1,26 @@
+import os
+
+from gestor_propostas.services.cache import ExcelCache
+
+
+def _gerar(caminho):
+    with open(caminho, "wb") as f:
+        f.write(b"planilha")
+
+
+def test_abrir_sem_planilha(tmp_path):
+    assert ExcelCache(str(tmp_path)).abrir("nao-existe") is None
+
+
+def test_arquivo_aberto_sobrevive_a_poda(tmp_path):
+    cache = ExcelCache(str(tmp_path), max_arquivos=1)
+    cache.guardar("a", _gerar)
+    arquivo = cache.abrir("a")
+    try:
+        # outro worker guarda uma planilha nova e a poda apaga a anterior
+        os.utime(cache.obter("a"), (0, 0))
+        cache.guardar("b", _gerar)
+        assert cache.obter("a") is None
+        assert arquivo.read() == b"planilha"
+    finally:
+        arquivo.close()
@@ -0,0 +1,24 @@
+from gestor_propostas.indice_texto import SEPARADOR, TrigramIndex
+
+
+def _indice():
+    indice = TrigramIndex()
+    indice.indexar(1, "Reforma elétrica", "Açougue São João")
+    indice.indexar(2, "Pintura", "Padaria")
+    return indice
+
+
+def test_busca_por_substring_sem_acentos():
+    indice = _indice()
+    assert indice.buscar("ELETR") == {1}
+    assert indice.buscar("sao jo") == {1}
+    assert indice.buscar("ri") == {1, 2}
+
+
+def test_busca_nao_atravessa_campos():
+    indice = _indice()
+    # fim do título + começo do cliente
+    assert indice.buscar("ricaacou") == set()
+    assert indice.buscar("rica\nacou") == set()
+    assert indice.buscar(f"rica{SEPARADOR}acou") == set()
+    assert indice.buscar(f"ca{SEPARADOR}a") == set()
@@ -0,0 +1,39 @@
+import sqlite3
+
+from gestor_propostas.models import GestorPropostas, ItemProposta
+from gestor_propostas.services.storage import StorageManager
+
+
+def _itens_no_banco(proposta_id):
+    conn = sqlite3.connect(StorageManager.DB_PATH)
+    try:
+        return sorted(
+            row[0]
+            for row in conn.execute(
+                "SELECT descricao FROM itens WHERE proposta_id = ?", (proposta_id,)
+            )
+        )
+    finally:
+        conn.close()
+
+
+def _salvar(proposta):
+    with StorageManager.sessao() as sessao:
+        sessao.salvar_cliente(proposta.cliente)
+        sessao.salvar_proposta(proposta)
+        sessao.sincronizar_itens(proposta)
+
+
+def test_trocar_a_lista_de_itens_apaga_os_que_sairam():
+    gestor = GestorPropostas()
+    proposta = gestor.criar_proposta(gestor.criar_cliente("Cliente"), "Proposta")
+    fica = ItemProposta("fica", 1, 10.0)
+    proposta.adicionar_item(fica)
+    proposta.adicionar_item(ItemProposta("sai", 2, 5.0))
+    _salvar(proposta)
+    assert _itens_no_banco(proposta.id) == ["fica", "sai"]
+
+    proposta.itens = [fica, ItemProposta("novo", 1, 1.0)]
+    _salvar(proposta)
+    assert _itens_no_banco(proposta.id) == ["fica", "novo"]
+    assert proposta.calcular_subtotal() == 11.0
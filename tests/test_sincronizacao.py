@@ -0,0 +1,95 @@
+"""Gravação adiada + sincronização entre processos.
+
+Cada processo é um interpretador novo: a importação de gestor_propostas
+abre o banco de DEALFLOW_BANCO e carrega o gestor global.
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CRIAR = """
+from gestor_propostas import gestor
+from gestor_propostas.services.storage import StorageManager
+
+with gestor.escrita():
+    cliente = gestor.criar_cliente("Cliente")
+    proposta = gestor.criar_proposta(cliente, "original")
+with StorageManager.sessao() as sessao:
+    sessao.salvar_cliente(cliente)
+    sessao.salvar_proposta(proposta)
+"""
+
+# processo B: grava na hora (gravação síncrona)
+RENOMEAR_B = """
+from gestor_propostas import gestor
+from gestor_propostas.services.storage import StorageManager
+
+proposta = gestor.listar_propostas()[0]
+with gestor.escrita():
+    proposta.titulo = "de B"
+with StorageManager.sessao() as sessao:
+    sessao.salvar_proposta(proposta)
+"""
+
+# processo A: gravação adiada com intervalo longo, para a escrita ainda
+# estar na fila quando B gravar
+RENOMEAR_A = """
+import os, subprocess, sys
+from gestor_propostas import gestor
+from gestor_propostas.services.storage import StorageManager
+
+proposta = gestor.listar_propostas()[0]
+with gestor.escrita():
+    proposta.titulo = "de A"
+with StorageManager.sessao() as sessao:
+    sessao.salvar_proposta(proposta)
+
+env = dict(os.environ, DEALFLOW_GRAVACAO="sincrona")
+subprocess.run([sys.executable, "-c", os.environ["RENOMEAR_B"]], env=env, check=True)
+
+StorageManager.sincronizar(gestor)
+StorageManager.fechar_conexoes()
+# a releitura troca o objeto: o que vale é o que o gestor devolve agora
+print(gestor.obter_proposta(proposta.id).titulo)
+"""
+
+
+def _rodar(codigo: str, env) -> str:
+    resultado = subprocess.run(
+        [sys.executable, "-c", textwrap.dedent(codigo)],
+        env=env,
+        cwd=RAIZ,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert resultado.returncode == 0, resultado.stderr
+    return resultado.stdout.strip()
+
+
+def test_fila_nao_grava_objeto_relido_por_cima_de_outro_processo(tmp_path):
+    banco = str(tmp_path / "banco.db")
+    env = dict(
+        os.environ,
+        PYTHONPATH=RAIZ,
+        DEALFLOW_BANCO=banco,
+        DEALFLOW_GRAVACAO="sincrona",
+        RENOMEAR_B=RENOMEAR_B,
+    )
+    _rodar(CRIAR, env)
+
+    env.update(DEALFLOW_GRAVACAO="adiada", DEALFLOW_GRAVACAO_INTERVALO="60")
+    titulo_em_memoria = _rodar(RENOMEAR_A, env)
+
+    conn = sqlite3.connect(banco)
+    try:
+        (titulo_no_banco,) = conn.execute("SELECT titulo FROM propostas").fetchone()
+    finally:
+        conn.close()
+    # a última gravação foi a de A (a fila), e o gestor de A tem que concordar
+    assert titulo_no_banco == "de A"
+    assert titulo_em_memoria == titulo_no_banco
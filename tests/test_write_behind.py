@@ -0,0 +1,65 @@
+import sqlite3
+
+import pytest
+
+from gestor_propostas.services.write_behind import WriteBehindQueue, banco_ocupado
+
+
+def _fila(gravar):
+    # intervalo longo: só grava quando o teste chama descarregar
+    return WriteBehindQueue(gravar, intervalo=60)
+
+
+def _operacao(nome):
+    return (("proposta", nome), lambda: None, (nome,))
+
+
+def test_banco_ocupado():
+    assert banco_ocupado(sqlite3.OperationalError("database is locked"))
+    assert not banco_ocupado(sqlite3.OperationalError("no such table: propostas"))
+    assert not banco_ocupado(sqlite3.IntegrityError("FOREIGN KEY constraint failed"))
+
+
+def test_erro_permanente_descarta_so_a_operacao():
+    gravadas = []
+
+    def gravar(operacoes):
+        operacoes = list(operacoes)
+        if any(args == (2,) for _, args in operacoes):
+            raise sqlite3.OperationalError("no such column: x")
+        gravadas.extend(args[0] for _, args in operacoes)
+
+    fila = _fila(gravar)
+    try:
+        fila.agendar([_operacao(1), _operacao(2), _operacao(3)])
+        with pytest.raises(sqlite3.OperationalError):
+            fila.descarregar()
+        assert gravadas == [1, 3]
+        # a fila não ficou presa na operação com erro
+        fila.agendar([_operacao(4)])
+        fila.descarregar()
+        assert gravadas == [1, 3, 4]
+    finally:
+        fila.parar()
+
+
+def test_banco_ocupado_devolve_o_lote_para_a_fila():
+    ocupado = [True]
+    gravadas = []
+
+    def gravar(operacoes):
+        if ocupado[0]:
+            raise sqlite3.OperationalError("database is locked")
+        gravadas.extend(args[0] for _, args in operacoes)
+
+    fila = _fila(gravar)
+    try:
+        fila.agendar([_operacao(1), _operacao(2)])
+        with pytest.raises(sqlite3.OperationalError):
+            fila.descarregar()
+        assert gravadas == []
+        ocupado[0] = False
+        fila.descarregar()
+        assert gravadas == [1, 2]
+    finally:
+        fila.parar()